@@ -0,0 +1,144 @@
+"""
+Compares the JSON codec backends and event loops on a synthetic trading workload.
+
+    python benchmarks/bench_codec_loop.py [--trades N]
+
+Backends and loops that are not installed are skipped.
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+BACKENDS = ("json", "orjson", "msgspec")
+
+
+def synthetic_trades(count: int):
+    rng = random.Random(42)
+    flags = ["🇩🇪", "🇫🇷", "🇯🇵", "🇧🇷", "🇨🇦"]
+    trades = []
+    for i in range(1, count + 1):
+        trades.append({
+            "op": "trade",
+            "transaction_id": i,
+            "batch_id": i,
+            "buyer_id": rng.randrange(10 ** 17, 10 ** 18),
+            "seller_id": rng.randrange(10 ** 17, 10 ** 18),
+            "channel_id": rng.randrange(10 ** 17, 10 ** 18),
+            "amount": rng.randrange(5, 100),
+            "timestamp": "2025-05-17 00:16:58.652000+00:00",
+            "offer_message_id": rng.randrange(10 ** 17, 10 ** 18),
+            "acceptor_id": None,
+            "message_id": rng.randrange(10 ** 17, 10 ** 18),
+            "guild_id": rng.randrange(10 ** 17, 10 ** 18),
+            "channel_name": "horse-of-the-year",
+            "flag": rng.choice(flags),
+            "resting_left": 0,
+            "incoming_left": 0
+        })
+    return trades
+
+
+def load_codec(backend: str):
+    os.environ["JSON_CODEC"] = backend
+    import utils.codec_utils as codec
+    codec = importlib.reload(codec)
+    return codec if codec.BACKEND == backend else None
+
+
+def timed(func, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_codecs(trades) -> None:
+    transactions = {"transactions": [
+        {key: trade[key] for key in ("transaction_id", "buyer_id", "seller_id", "channel_id", "amount", "timestamp")}
+        for trade in trades
+    ]}
+    print(f"Serialization ({len(trades)} journal records, one transaction file)")
+    columns = ("journal enc", "journal dec", "file enc", "file dec")
+    print(f"{'backend':<10}" + "".join(f"{column:>18}" for column in columns))
+    baseline = None
+    for backend in BACKENDS:
+        codec = load_codec(backend)
+        if codec is None:
+            print(f"{backend:<10}not installed")
+            continue
+        lines = [codec.dumps(trade) for trade in trades]
+        pretty = codec.dumps(transactions, pretty=True)
+        results = (
+            timed(lambda: [codec.dumps(trade) for trade in trades]),
+            timed(lambda: [codec.loads(line) for line in lines]),
+            timed(lambda: codec.dumps(transactions, pretty=True)),
+            timed(lambda: codec.loads(pretty)),
+        )
+        baseline = baseline or results
+        print(f"{backend:<10}" + "".join(
+            f"{seconds * 1000:>10.1f}ms {base / seconds:>4.1f}x" for seconds, base in zip(results, baseline)
+        ))
+
+
+async def event_workload(events: int, workers: int = 8) -> None:
+    """Fan trade events out to workers through a queue, like the message handlers and effect tasks do"""
+    queue: asyncio.Queue = asyncio.Queue()
+    done = asyncio.Event()
+    remaining = events
+
+    async def worker():
+        nonlocal remaining
+        while True:
+            await queue.get()
+            await asyncio.sleep(0)
+            remaining -= 1
+            if remaining == 0:
+                done.set()
+
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    for i in range(events):
+        queue.put_nowait(i)
+        if i % 64 == 0:
+            await asyncio.sleep(0)
+    await done.wait()
+    for task in tasks:
+        task.cancel()
+
+
+def bench_loops(events: int) -> None:
+    print(f"\nEvent loop ({events} queued events across 8 workers)")
+    loops = [("asyncio", asyncio.DefaultEventLoopPolicy)]
+    try:
+        import uvloop
+        loops.append(("uvloop", uvloop.EventLoopPolicy))
+    except ImportError:
+        print("uvloop    not installed")
+
+    baseline = None
+    for name, policy in loops:
+        asyncio.set_event_loop_policy(policy())
+        seconds = timed(lambda: asyncio.run(event_workload(events)), repeat=3)
+        baseline = baseline or seconds
+        print(f"{name:<10}{seconds * 1000:>9.1f}ms {baseline / seconds:.1f}x")
+    asyncio.set_event_loop_policy(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--trades", type=int, default=20000)
+    args = parser.parse_args()
+    bench_codecs(synthetic_trades(args.trades))
+    bench_loops(args.trades * 5)
+
+
+if __name__ == "__main__":
+    main()
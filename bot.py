@@ -1,19 +1,26 @@
+import asyncio
 import logging
 import os
-from pathlib import Path
 
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
+from utils.admission_utils import PriorityGate
 from utils.config_utils import load_config
+from utils.logging_utils import parse_level, setup_logging
+from utils.timing_utils import PhaseTimer
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+# Extensions needed before trading can resume, loaded before connecting
+CORE_EXTENSIONS = ("cogs.trading", "cogs.horse_admin")
+# Report extensions, loaded in the background once the bot is connected
+DEFERRED_EXTENSIONS = ("cogs.checkbalance", "cogs.gettransactionlog", "cogs.diagnostics", "cogs.api")
+# How many trade messages and reports may be processed at once
+WORK_CONCURRENCY = 8
+# Default size of discord.py's message cache, overridable with max_messages in config
+DEFAULT_MAX_MESSAGES = 200
+
 
 class TradingBot(commands.Bot):
     """
@@ -21,22 +28,35 @@ class TradingBot(commands.Bot):
     """
 
     def __init__(self):
-        intents = discord.Intents.default()
-        intents.messages = True
+        self.startup_timer = PhaseTimer()
+
+        # Load config; later load_config calls reuse this read
+        with self.startup_timer.phase("config"):
+            config = load_config()
+
+        # Only what the market uses: guilds, guild messages and their content.
+        # Member, presence, typing, reaction and DM events are never delivered.
+        intents = discord.Intents.none()
+        intents.guilds = True
+        intents.guild_messages = True
         intents.message_content = True
 
         super().__init__(
             command_prefix='!',
             intents=intents,
-            description="A Discord bot for managing horse trading channels"
+            description="A Discord bot for managing horse trading channels",
+            # Offers keep their own message references, so the message cache only needs to be small
+            max_messages=config.get("max_messages", DEFAULT_MAX_MESSAGES),
+            chunk_guilds_at_startup=False,
+            member_cache_flags=discord.MemberCacheFlags.none()
         )
 
+        # Shared by trades and reports so trades are served first under load
+        self.work_gate = PriorityGate(WORK_CONCURRENCY)
+
         # Initialize bot state
         self.transaction_counter = 0
         self.ready = False
-
-        # Load config
-        config = load_config()
         self.logchannel = config.get("log_channel")
         self.horse_channels = config.get("horsechannels", {})
 
@@ -44,24 +64,45 @@ class TradingBot(commands.Bot):
         """
         This is called when the bot is started up
         """
-        # Load all cogs
-        await self.load_extensions()
+        # Load the cogs trading depends on
+        await self.load_extensions(CORE_EXTENSIONS)
+
+        # Load the report cogs and register slash commands without holding up the connection
+        asyncio.create_task(self.finish_startup())
         logger.info("Bot is ready to start!")
 
-    async def load_extensions(self):
+    async def finish_startup(self):
         """
-        Loads all cog extensions from the cogs directory
+        Loads the deferred extensions, then publishes the hybrid commands as slash commands
         """
-        cogs_dir = Path(__file__).parent / "cogs"
-        for filename in cogs_dir.glob("*.py"):
-            if filename.stem == "__init__":
-                continue
-
+        await self.wait_until_ready()
+        await self.load_extensions(DEFERRED_EXTENSIONS)
+        try:
+            synced = await self.tree.sync()
+            logger.info(f"Synced {len(synced)} application commands")
+        except discord.HTTPException as e:
+            logger.error(f"Failed to sync application commands: {e}")
+
+    async def load_extensions(self, extensions):
+        """
+        Loads the given cog extensions, timing each one
+        """
+        for extension in extensions:
             try:
-                await self.load_extension(f"cogs.{filename.stem}")
-                logger.info(f"Loaded extension: {filename.stem}")
+                with self.startup_timer.phase(f"load {extension}"):
+                    await self.load_extension(extension)
+                logger.info(f"Loaded extension: {extension}")
             except Exception as e:
-                logger.error(f"Failed to load extension {filename.stem}: {e}")
+                logger.error(f"Failed to load extension {extension}: {e}")
+
+    async def on_message(self, message: discord.Message):
+        """
+        Only hands prefixed messages to the command parser. Trade messages are
+        handled by the Trading cog's own listener.
+        """
+        if message.author.bot or not message.content.startswith(self.command_prefix):
+            return
+        await self.process_commands(message)
 
     async def on_ready(self):
         """
@@ -70,6 +111,9 @@ class TradingBot(commands.Bot):
 
         self.ready = True
         logger.info(f'Logged in as {self.user.name} (ID: {self.user.id})')
+        logger.info(
+            f"Startup took {self.startup_timer.elapsed():.3f}s ({self.startup_timer.summary()})"
+        )
 
         # Set bot presence
         await self.change_presence(
@@ -86,11 +130,23 @@ def main():
     # Load environment variables
     load_dotenv()
 
+    # Log through a background thread to rotating JSON files and the console
+    log_listener = setup_logging(parse_level(os.getenv("LOG_LEVEL")))
+
     # Get the token from environment variables
     token = os.getenv("DISCORD_TOKEN")
     if not token:
         raise ValueError("No token found in .env file")
 
+    # Opt in to uvloop's faster event loop
+    if os.getenv("USE_UVLOOP", "").lower() in ("1", "true", "yes"):
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            logger.info("Using the uvloop event loop")
+        except ImportError:
+            logger.warning("USE_UVLOOP is set but uvloop is not installed; using the default event loop")
+
     # Create and run bot
     bot = TradingBot()
 
@@ -100,6 +156,8 @@ def main():
         logger.error("Failed to log in: Invalid token")
     except Exception as e:
         logger.error(f"An error occurred: {e}")
+    finally:
+        log_listener.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import os
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from aiohttp import web
+from discord.ext import commands
+
+from utils.codec_utils import dumps
+
+SSE_QUEUE_SIZE = 100  # Trades buffered per stream client before it is dropped as too slow
+SSE_HEARTBEAT = 15.0  # Seconds between keep-alive comments on idle streams
+MAX_TRADES_LIMIT = 200
+
+logger = logging.getLogger(__name__)
+
+
+def public_trade(trade: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Strip a trade record down to the fields dashboards need.
+    Snowflakes are sent as strings because JavaScript numbers cannot hold them exactly.
+    """
+    return {
+        "transaction_id": trade["transaction_id"],
+        "buyer_id": str(trade["buyer_id"]),
+        "seller_id": str(trade["seller_id"]),
+        "channel_id": str(trade["channel_id"]),
+        "channel_name": trade.get("channel_name"),
+        "amount": trade["amount"],
+        "timestamp": trade["timestamp"]
+    }
+
+
+class MarketAPI(commands.Cog):
+    """
+    A cog serving a read-only HTTP/JSON API over the in-memory market state.
+
+    The server is only started when the API_PORT environment variable is set.
+    Responses carry an ETag derived from the Trading cog's state version, so
+    polling clients get a 304 without the response being rebuilt.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        """
+        Initialize the MarketAPI cog.
+
+        Args:
+            bot (commands.Bot): The bot instance this cog is attached to
+        """
+        self.bot = bot
+        self.runner: Optional[web.AppRunner] = None
+        self.subscribers: Set[asyncio.Queue] = set()
+        # Distinguishes ETags from different runs of the bot
+        self.boot_id = uuid.uuid4().hex[:8]
+
+    async def cog_load(self) -> None:
+        port = os.getenv("API_PORT")
+        if not port:
+            return
+
+        app = web.Application()
+        app.add_routes([
+            web.get("/api/round", self.get_round),
+            web.get("/api/orderbook", self.get_orderbooks),
+            web.get("/api/orderbook/{channel_id}", self.get_orderbook),
+            web.get("/api/balances", self.get_balances),
+            web.get("/api/trades", self.get_trades),
+            web.get("/api/trades/stream", self.stream_trades),
+        ])
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        host = os.getenv("API_HOST", "127.0.0.1")
+        await web.TCPSite(self.runner, host, int(port)).start()
+        logger.info("Market API listening on http://%s:%s", host, port)
+
+    async def cog_unload(self) -> None:
+        for queue in self.subscribers:
+            # Make room in a full queue so the shutdown marker always fits
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    @commands.Cog.listener()
+    async def on_horse_trade(self, trade: Dict[str, Any]) -> None:
+        if not self.subscribers:
+            return
+        event = public_trade(trade)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Disconnect clients that cannot keep up rather than buffer without bound
+                self.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    def _trading(self):
+        trading_cog = self.bot.get_cog('Trading')
+        if trading_cog is None:
+            raise web.HTTPServiceUnavailable(text="Trading is not loaded")
+        return trading_cog
+
+    def _cached_json(self, request: web.Request, build) -> web.Response:
+        """
+        Answer with 304 if the client's ETag matches the current state, otherwise build the body.
+        """
+        etag = f'W/"{self.boot_id}-{self._trading().state_version}"'
+        if etag in request.headers.get("If-None-Match", ""):
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(
+            body=dumps(build()),
+            content_type="application/json",
+            headers={"ETag": etag, "Cache-Control": "no-cache"}
+        )
+
+    def _depth(self, offers) -> Dict[str, List[List[int]]]:
+        """
+        Aggregate active offers into price levels, best first.
+        """
+        levels = {"buy": {}, "sell": {}}
+        for offer in offers:
+            if offer.active:
+                side = levels[offer.offer_type]
+                side[offer.price] = side.get(offer.price, 0) + offer.quantity
+        return {
+            "bids": [[price, size] for price, size in sorted(levels["buy"].items(), reverse=True)],
+            "asks": [[price, size] for price, size in sorted(levels["sell"].items())]
+        }
+
+    def _book(self, trading_cog, channel_id: int) -> Dict[str, Any]:
+        return {
+            "channel_id": str(channel_id),
+            "name": trading_cog.horse_channels.get(str(channel_id)),
+            "closed": channel_id in trading_cog.finished_horses,
+            **self._depth(trading_cog.offers.get(channel_id, []))
+        }
+
+    async def get_round(self, request: web.Request) -> web.Response:
+        trading_cog = self._trading()
+        return self._cached_json(request, lambda: {
+            "round": trading_cog.trading_manager.current_round,
+            "expire_at_round_close": trading_cog.expire_at_round_close,
+            "channels": [
+                {
+                    "channel_id": channel_id,
+                    "name": name,
+                    "closed": int(channel_id) in trading_cog.finished_horses,
+                    "offer_ttl": trading_cog.offer_ttls.get(channel_id),
+                    "auction": channel_id in trading_cog.auction_channels
+                }
+                for channel_id, name in trading_cog.horse_channels.items()
+            ]
+        })
+
+    async def get_orderbooks(self, request: web.Request) -> web.Response:
+        trading_cog = self._trading()
+        return self._cached_json(request, lambda: [
+            self._book(trading_cog, int(channel_id)) for channel_id in trading_cog.horse_channels
+        ])
+
+    async def get_orderbook(self, request: web.Request) -> web.Response:
+        trading_cog = self._trading()
+        try:
+            channel_id = int(request.match_info["channel_id"])
+        except ValueError:
+            raise web.HTTPBadRequest(text="channel_id must be a number")
+        if str(channel_id) not in trading_cog.horse_channels:
+            raise web.HTTPNotFound(text="Not a horse channel")
+        return self._cached_json(request, lambda: self._book(trading_cog, channel_id))
+
+    async def get_balances(self, request: web.Request) -> web.Response:
+        trading_cog = self._trading()
+        manager = trading_cog.trading_manager
+
+        def build():
+            board = manager.leaderboard
+            return [
+                {
+                    "rank": rank,
+                    "user_id": str(user_id),
+                    "net": net,
+                    "hype": hype,
+                    "money": manager.user_balances[user_id]["money"],
+                    "garnets": manager.user_balances[user_id]["garnets"]
+                }
+                for rank, (user_id, net, hype) in enumerate(board.top(len(board)), start=1)
+            ]
+
+        return self._cached_json(request, build)
+
+    async def get_trades(self, request: web.Request) -> web.Response:
+        trading_cog = self._trading()
+        try:
+            limit = min(int(request.query.get("limit", 50)), MAX_TRADES_LIMIT)
+        except ValueError:
+            raise web.HTTPBadRequest(text="limit must be a number")
+        return self._cached_json(request, lambda: [
+            public_trade(trade) for trade in list(trading_cog.recent_trades)[-limit:]
+        ] if limit > 0 else [])
+
+    async def stream_trades(self, request: web.Request) -> web.StreamResponse:
+        """
+        Server-sent events stream with one `trade` event per new trade.
+        """
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        })
+        await response.prepare(request)
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        try:
+            while True:
+                try:
+                    trade = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    await response.write(b": keep-alive\n\n")
+                    continue
+                if trade is None:
+                    break
+                await response.write(
+                    f"id: {trade['transaction_id']}\nevent: trade\ndata: ".encode() + dumps(trade) + b"\n\n"
+                )
+        except ConnectionResetError:
+            pass
+        finally:
+            self.subscribers.discard(queue)
+        return response
+
+
+async def setup(bot: commands.Bot) -> None:
+    """
+    Set up the MarketAPI cog.
+
+    Args:
+        bot (commands.Bot): The bot instance to add this cog to
+    """
+    await bot.add_cog(MarketAPI(bot))
@@ -1,6 +1,9 @@
 from typing import Dict
-import json
+import discord
+from discord import app_commands
 from discord.ext import commands
+from utils.admission_utils import REPORT_PRIORITY
+from utils.codec_utils import DecodeError, TransactionFileData, loads
 from utils.config_utils import load_config, save_config
 
 
@@ -14,99 +17,136 @@ class CheckBalance(commands.Cog):
         """Check if command is used in allowed channels."""
         return not ('horse' in ctx.channel.name.lower() or 'log' in ctx.channel.name.lower())
 
-    @commands.command(name="balance")
+    @commands.hybrid_command(name="balance")
     @commands.check(check_channel)
-    async def checkbalance(self, ctx: commands.Context, member: commands.MemberConverter = None) -> None:
+    @app_commands.describe(member="Member to check. Defaults to yourself.")
+    async def checkbalance(self, ctx: commands.Context, member: discord.Member = None) -> None:
         """Check balance and total transactions for yourself or another user.
 
         Args:
             ctx: The command context
             member: Optional member to check balance for. If not provided, checks own balance.
         """
-        target_user = member if member else ctx.author
-        user_id = target_user.id
-        balance = 0
-        stock = []  # Initialize as empty list
-        # Load transactions to count total trades
-        transactions = self.load_transactions()
-        user_transactions = [
-            t for t in transactions["transactions"]  # Removed .get() here
-            if t["buyer_id"] == user_id or t["seller_id"] == user_id
-        ]
-        horse_hype_counts = {}
-        messages = []
-
-        for ut in user_transactions:
-            channel = self.bot.get_channel(ut["channel_id"])
-            channel_name = channel.name if channel else f"Channel {ut['channel_id']}"
-            if ut["buyer_id"] == user_id:
-                balance -= ut["amount"]
-                stock.append(f"ID: {ut['transaction_id']} - {channel_name} bought for {ut['amount']}")
-                if channel and "horse" in channel.name.lower():
-                    clean_name = channel.name.replace("horse-of-", "")
-                    if clean_name not in horse_hype_counts:
-                        horse_hype_counts[clean_name] = 0
-                    horse_hype_counts[clean_name] += 1
-            elif ut["seller_id"] == user_id:
-                balance += ut["amount"]
-                stock.append(f"ID: {ut['transaction_id']} - {channel_name} sold for {ut['amount']}")
-                if channel and "horse" in channel.name.lower():
-                    clean_name = channel.name.replace("horse-of-", "")
-                    if clean_name not in horse_hype_counts:
-                        horse_hype_counts[clean_name] = 0
-                    horse_hype_counts[clean_name] -= 1
-
-        # Create the balance message
-        messages = []
-        current_message = f"# Balance Report for {target_user.name}\n"
-        current_message += f"Current Balance: ➕/➖ ${balance}\n"
-        current_message += f"Total Transactions: {len(user_transactions)}\n"
-
-        # Add transactions with splitting if needed
-        if stock:
-            current_message += "Transaction History:\n"
-            for transaction in stock:
-                line = f"- {transaction}\n"
-                # Check if adding this line would exceed the limit
-                if len(current_message + line) > 1900:
-                    messages.append(current_message)
-                    current_message = "Transaction History (continued):\n"
-                current_message += line
-
-        # Add horse hype section
-        horse_hype_section = f"\n# HORSE HYPE\n"
-        horse_hype_section += f"-# Since I'm live coding this and adding this in on the fly the numbers below may be inaccurate\n"
-        if horse_hype_counts:
-            for horse, count in horse_hype_counts.items():
-                horse_hype_section += f"- {horse}: {count} hype\n"
-        else:
-            horse_hype_section += "- No horse hype owned\n"
+        await ctx.defer(ephemeral=True)
+        async with self.bot.work_gate.slot(REPORT_PRIORITY):
+            target_user = member if member else ctx.author
+            user_id = target_user.id
+            balance = 0
+            stock = []  # Initialize as empty list
+            # Load transactions to count total trades
+            transactions = self.load_transactions()
+            user_transactions = [
+                t for t in transactions["transactions"]  # Removed .get() here
+                if t["buyer_id"] == user_id or t["seller_id"] == user_id
+            ]
+            horse_hype_counts = {}
+            messages = []
+
+            for ut in user_transactions:
+                channel = self.bot.get_channel(ut["channel_id"])
+                channel_name = channel.name if channel else f"Channel {ut['channel_id']}"
+                if ut["buyer_id"] == user_id:
+                    balance -= ut["amount"]
+                    stock.append(f"ID: {ut['transaction_id']} - {channel_name} bought for {ut['amount']}")
+                    if channel and "horse" in channel.name.lower():
+                        clean_name = channel.name.replace("horse-of-", "")
+                        if clean_name not in horse_hype_counts:
+                            horse_hype_counts[clean_name] = 0
+                        horse_hype_counts[clean_name] += 1
+                elif ut["seller_id"] == user_id:
+                    balance += ut["amount"]
+                    stock.append(f"ID: {ut['transaction_id']} - {channel_name} sold for {ut['amount']}")
+                    if channel and "horse" in channel.name.lower():
+                        clean_name = channel.name.replace("horse-of-", "")
+                        if clean_name not in horse_hype_counts:
+                            horse_hype_counts[clean_name] = 0
+                        horse_hype_counts[clean_name] -= 1
+
+            # Create the balance message
+            messages = []
+            current_message = f"# Balance Report for {target_user.name}\n"
+            current_message += f"Current Balance: ➕/➖ ${balance}\n"
+            current_message += f"Total Transactions: {len(user_transactions)}\n"
+
+            # Add transactions with splitting if needed
+            if stock:
+                current_message += "Transaction History:\n"
+                for transaction in stock:
+                    line = f"- {transaction}\n"
+                    # Check if adding this line would exceed the limit
+                    if len(current_message + line) > 1900:
+                        messages.append(current_message)
+                        current_message = "Transaction History (continued):\n"
+                    current_message += line
+
+            # Add horse hype section
+            horse_hype_section = f"\n# HORSE HYPE\n"
+            horse_hype_section += f"-# Since I'm live coding this and adding this in on the fly the numbers below may be inaccurate\n"
+            if horse_hype_counts:
+                for horse, count in horse_hype_counts.items():
+                    horse_hype_section += f"- {horse}: {count} hype\n"
+            else:
+                horse_hype_section += "- No horse hype owned\n"
+
+            # Check if adding horse hype section would exceed limit
+            if len(current_message + horse_hype_section) > 1900:
+                messages.append(current_message)
+                current_message = horse_hype_section
+            else:
+                current_message += horse_hype_section
+
+            # Add the final message if it's not empty
+            if current_message:
+                messages.append(current_message)
+
+            # Send all messages
+            for msg in messages:
+                await ctx.send(msg, ephemeral=True)
+
+    @commands.hybrid_command(name="leaderboard")
+    @commands.check(check_channel)
+    @app_commands.describe(count="Number of players to list (1-25)")
+    async def leaderboard(self, ctx: commands.Context, count: int = 10) -> None:
+        """Show the top players by net balance and hype, plus your own rank.
 
-        # Check if adding horse hype section would exceed limit
-        if len(current_message + horse_hype_section) > 1900:
-            messages.append(current_message)
-            current_message = horse_hype_section
+        Args:
+            ctx: The command context
+            count: Number of players to list. Defaults to 10.
+        """
+        trading_cog = self.bot.get_cog('Trading')
+        if trading_cog is None:
+            await ctx.send("Trading is not available right now.")
+            return
+
+        board = trading_cog.trading_manager.leaderboard
+        if not len(board):
+            await ctx.send("No trades have been made yet.")
+            return
+
+        count = max(1, min(count, 25))
+        current_message = f"# Leaderboard (top {count} of {len(board)})\n"
+        for position, (user_id, net, hype) in enumerate(board.top(count), start=1):
+            current_message += f"{position}. <@{user_id}> ➕/➖ ${net} | {hype} hype\n"
+
+        rank = board.rank(ctx.author.id)
+        if rank is None:
+            current_message += "\nYou have not traded yet."
         else:
-            current_message += horse_hype_section
-
-        # Add the final message if it's not empty
-        if current_message:
-            messages.append(current_message)
+            net, hype = board.entry(ctx.author.id)
+            current_message += f"\nYour rank: #{rank} (➕/➖ ${net} | {hype} hype)"
 
-        # Send all messages
-        for msg in messages:
-            await ctx.send(msg)
+        await ctx.send(current_message)
 
     def load_transactions(self) -> Dict:
         """Load transactions from JSON file."""
         try:
-            with open("data/transactions.json", 'r') as f:
-                data = json.load(f)
+            with open("data/transactions.json", 'rb') as f:
+                data = loads(f.read(), type=TransactionFileData)
                 # Ensure we have a transactions key with a list
                 if isinstance(data, list):
                     return {"transactions": data}
                 return data
-        except (json.JSONDecodeError, FileNotFoundError):
+        except (DecodeError, FileNotFoundError):
             return {"transactions": []}
 
 
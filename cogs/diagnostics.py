@@ -0,0 +1,200 @@
+import asyncio
+import cProfile
+import io
+import logging
+import time
+import tracemalloc
+from typing import Dict, Optional
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from utils.memory_utils import format_bytes, peak_rss_bytes, rss_bytes
+from utils.profiling_utils import TRACEMALLOC_FRAMES, allocation_summary, profile_summary
+
+logger = logging.getLogger(__name__)
+
+MAX_CAPTURE_SECONDS = 300  # Keeps captures well inside an interaction's follow-up window
+
+
+class Diagnostics(commands.Cog):
+    """
+    A cog for inspecting the running bot's caches and memory use.
+
+    Profiler and allocation captures run inside the live process for a fixed
+    time, so nothing is traced unless an admin has started a capture.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        """
+        Initialize the Diagnostics cog.
+
+        Args:
+            bot (commands.Bot): The bot instance this cog is attached to
+        """
+        self.bot = bot
+        # Set while a capture is running; setting the event ends it early
+        self.capture_stop: Optional[asyncio.Event] = None
+
+    def cache_stats(self) -> Dict[str, int]:
+        """
+        Count what the discord.py client and the order books are holding in memory.
+
+        Returns:
+            Dict[str, int]: Named cache sizes
+        """
+        stats = {
+            "guilds": len(self.bot.guilds),
+            "channels": sum(len(guild.channels) for guild in self.bot.guilds),
+            "members": sum(len(guild.members) for guild in self.bot.guilds),
+            "users": len(self.bot.users),
+            "cached messages": len(self.bot.cached_messages),
+        }
+
+        trading_cog = self.bot.get_cog('Trading')
+        if trading_cog:
+            offers = [offer for channel_offers in trading_cog.offers.values() for offer in channel_offers]
+            stats["book entries"] = len(offers)
+            stats["active offers"] = sum(1 for offer in offers if offer.active)
+            stats["full offer messages"] = sum(1 for offer in offers if isinstance(offer.message, discord.Message))
+            stats["ranked players"] = len(trading_cog.trading_manager.leaderboard)
+        return stats
+
+    def memory_report(self) -> str:
+        """
+        Build a short report of cache sizes and process memory.
+
+        Returns:
+            str: The formatted report
+        """
+        lines = [f"- {name}: {count}" for name, count in self.cache_stats().items()]
+        lines.append(f"- RSS: {format_bytes(rss_bytes())} (peak {format_bytes(peak_rss_bytes())})")
+        return "\n".join(lines)
+
+    async def cog_load(self) -> None:
+        # Loaded with the deferred extensions, so the guilds are already in the cache
+        logger.info("Cache profile after startup:\n%s", self.memory_report(), extra={"cache_stats": self.cache_stats()})
+
+    @commands.hybrid_command(name="cachestats")
+    @commands.has_permissions(manage_channels=True)
+    @app_commands.default_permissions(manage_channels=True)
+    async def cachestats(self, ctx: commands.Context) -> None:
+        """
+        Show cache sizes and memory use of the running bot.
+
+        Args:
+            ctx (commands.Context): The command context
+        """
+        await ctx.send(f"# Cache and memory\n{self.memory_report()}", ephemeral=True)
+
+    async def _run_capture(self, ctx: commands.Context, seconds: int, start, stop) -> None:
+        """
+        Run start(), wait for the capture window or !stopcapture, then upload what stop(elapsed) summarizes.
+        """
+        if self.capture_stop is not None:
+            await ctx.send("A capture is already running. Use `!stopcapture` to end it.", ephemeral=True)
+            return
+        seconds = max(1, min(seconds, MAX_CAPTURE_SECONDS))
+        await ctx.defer(ephemeral=True)
+
+        self.capture_stop = asyncio.Event()
+        started = time.perf_counter()
+        try:
+            start()
+        except BaseException:
+            self.capture_stop = None
+            raise
+        try:
+            try:
+                await asyncio.wait_for(self.capture_stop.wait(), timeout=seconds)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            elapsed = time.perf_counter() - started
+            summarize = stop(elapsed)
+            self.capture_stop = None
+
+        # Formatting the report is slow, so keep it off the event loop
+        report = await asyncio.to_thread(summarize)
+        name = f"{ctx.command.name}-{time.strftime('%Y%m%d-%H%M%S')}.txt"
+        await ctx.send(
+            f"Captured {elapsed:.1f}s.",
+            file=discord.File(io.BytesIO(report.encode()), filename=name),
+            ephemeral=True
+        )
+
+    @commands.hybrid_command(name="profile")
+    @commands.has_permissions(manage_channels=True)
+    @app_commands.default_permissions(manage_channels=True)
+    @app_commands.describe(seconds=f"How long to profile (1-{MAX_CAPTURE_SECONDS})")
+    async def profile(self, ctx: commands.Context, seconds: int = 30) -> None:
+        """
+        Profile the running bot with cProfile and upload the top functions.
+
+        Args:
+            ctx (commands.Context): The command context
+            seconds (int): How long to profile for
+        """
+        profiler = cProfile.Profile()
+
+        def stop(elapsed: float):
+            profiler.disable()
+            return lambda: profile_summary(profiler, elapsed)
+
+        await self._run_capture(ctx, seconds, profiler.enable, stop)
+
+    @commands.hybrid_command(name="tracealloc")
+    @commands.has_permissions(manage_channels=True)
+    @app_commands.default_permissions(manage_channels=True)
+    @app_commands.describe(seconds=f"How long to trace allocations (1-{MAX_CAPTURE_SECONDS})")
+    async def tracealloc(self, ctx: commands.Context, seconds: int = 30) -> None:
+        """
+        Trace memory allocations with tracemalloc and upload the top allocation sites.
+
+        Args:
+            ctx (commands.Context): The command context
+            seconds (int): How long to trace for
+        """
+        # Leave tracing on afterwards if someone else (e.g. PYTHONTRACEMALLOC) started it
+        already_tracing = tracemalloc.is_tracing()
+        snapshots = []
+
+        def start():
+            if not already_tracing:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            snapshots.append(tracemalloc.take_snapshot())
+
+        def stop(elapsed: float):
+            snapshots.append(tracemalloc.take_snapshot())
+            if not already_tracing:
+                tracemalloc.stop()
+            return lambda: allocation_summary(snapshots[0], snapshots[1], elapsed)
+
+        await self._run_capture(ctx, seconds, start, stop)
+
+    @commands.hybrid_command(name="stopcapture")
+    @commands.has_permissions(manage_channels=True)
+    @app_commands.default_permissions(manage_channels=True)
+    async def stopcapture(self, ctx: commands.Context) -> None:
+        """
+        End a running profile or allocation capture early and upload its results.
+
+        Args:
+            ctx (commands.Context): The command context
+        """
+        if self.capture_stop is None:
+            await ctx.send("No capture is running.", ephemeral=True)
+            return
+        self.capture_stop.set()
+        await ctx.send("⏹️ Stopping the capture.", ephemeral=True)
+
+
+async def setup(bot: commands.Bot) -> None:
+    """
+    Set up the Diagnostics cog.
+
+    Args:
+        bot (commands.Bot): The bot instance to add this cog to
+    """
+    await bot.add_cog(Diagnostics(bot))
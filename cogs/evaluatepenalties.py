@@ -1,6 +1,9 @@
-import json
+import sys
 from datetime import datetime
 
+from utils.archive_utils import TradeArchive
+from utils.codec_utils import DecodeError, TransactionFileData, loads
+
 # Round end timestamps
 ROUND_ENDS = {
     "R01": "2025-05-16T23:54:59.944Z",
@@ -26,15 +29,34 @@ ROUND_ENDS = {
 def load_transactions():
     """Load transactions from JSON file."""
     try:
-        with open("data/transactions.json", 'r') as f:
-            data = json.load(f)
+        with open("data/transactions.json", 'rb') as f:
+            data = loads(f.read(), type=TransactionFileData)
             return data.get("transactions", []) if isinstance(data, dict) else data
-    except (json.JSONDecodeError, FileNotFoundError):
+    except (DecodeError, FileNotFoundError):
         return []
 
 
-def evaluate_penalties():
-    """Evaluate penalties for players who accepted more than 2 offers in a round."""
+def count_archived_acceptances(path):
+    """Count acceptances per round and buyer by scanning an event archive in place."""
+    penalties = {}
+    with TradeArchive(path) as archive:
+        for trade in archive:
+            if not trade.round:
+                continue
+            round_data = penalties.setdefault(f"R{trade.round:02}", {})
+            round_data[trade.buyer_id] = round_data.get(trade.buyer_id, 0) + 1
+    return penalties
+
+
+def evaluate_penalties(archive_path=None):
+    """Evaluate penalties for players who accepted more than 2 offers in a round.
+
+    If archive_path is given, a closed event's trade archive is evaluated instead
+    of the live transaction file.
+    """
+    if archive_path is not None:
+        return collect_penalties(count_archived_acceptances(archive_path))
+
     # Convert timestamps to datetime objects
     round_times = {k: datetime.fromisoformat(v.replace('Z', '+00:00'))
                    for k, v in ROUND_ENDS.items()}
@@ -49,12 +71,15 @@ def evaluate_penalties():
     for trans in transactions:
         trans_time = datetime.fromisoformat(trans['timestamp'].replace('Z', '+00:00'))
 
-        # Find which round this transaction belongs to
+        # Find which round this transaction belongs to; newer trades record it themselves
         current_round = None
-        for round_num, (round_name, round_end) in enumerate(sorted_round_times):
-            if trans_time <= round_end:
-                current_round = round_name
-                break
+        if 'round' in trans:
+            current_round = f"R{trans['round']:02}"
+        else:
+            for round_num, (round_name, round_end) in enumerate(sorted_round_times):
+                if trans_time <= round_end:
+                    current_round = round_name
+                    break
 
         if current_round:
             # Initialize round data if needed
@@ -68,7 +93,11 @@ def evaluate_penalties():
             else:
                 penalties[current_round][buyer_id] += 1
 
-    # Evaluate penalties
+    return collect_penalties(penalties)
+
+
+def collect_penalties(penalties):
+    """Turn per-round acceptance counts into a list of penalties."""
     final_penalties = []
     for round_name, round_data in penalties.items():
         for player_id, accept_count in round_data.items():
@@ -83,7 +112,7 @@ def evaluate_penalties():
 
 
 def main():
-    penalties = evaluate_penalties()
+    penalties = evaluate_penalties(sys.argv[1] if len(sys.argv) > 1 else None)
 
     if penalties:
         print("Players with penalties:")
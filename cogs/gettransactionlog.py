@@ -1,7 +1,12 @@
 import discord
+from discord import app_commands
 from discord.ext import commands
-import json
+from utils.admission_utils import REPORT_PRIORITY
 from datetime import datetime
+from typing import List, Literal, Optional
+
+from utils.archive_utils import TradeArchive, archive_path, list_events
+from utils.codec_utils import DecodeError, TransactionFileData, TransactionRecord, loads
 
 
 class TransactionLog(commands.Cog):
@@ -31,10 +36,10 @@ class TransactionLog(commands.Cog):
     def load_transactions(self):
         """Load transactions from JSON file."""
         try:
-            with open("data/transactions.json", 'r') as f:
-                data = json.load(f)
+            with open("data/transactions.json", 'rb') as f:
+                data = loads(f.read(), type=TransactionFileData)
                 return data.get("transactions", []) if isinstance(data, dict) else data
-        except (json.JSONDecodeError, FileNotFoundError):
+        except (DecodeError, FileNotFoundError):
             return []
 
     def get_round(self, timestamp: str) -> str:
@@ -50,18 +55,9 @@ class TransactionLog(commands.Cog):
             prev_round_end = round_end_time
         return "After R17"
 
-    @commands.command(name="transactionlog")
-    async def transaction_log(self, ctx: commands.Context, user_id: int, transaction_type: str = None):
-        """
-        Get transaction log for a specific user.
-        Usage: !transactionlog <user_id> [buy|sell]
-        """
-        transactions = self.load_transactions()
-        if not transactions:
-            await ctx.send("No transactions found.")
-            return
-
-        # Filter transactions for the specified user
+    def load_user_transactions(self, transactions: List[TransactionRecord], user_id: int,
+                               transaction_type: str = None):
+        """Collect a user's trades from the already loaded live transactions."""
         user_transactions = []
         for trans in transactions:
             if transaction_type:
@@ -73,55 +69,130 @@ class TransactionLog(commands.Cog):
                 if trans['buyer_id'] == user_id or trans['seller_id'] == user_id:
                     user_transactions.append(trans)
 
-        if not user_transactions:
-            await ctx.send(f"No {'buy' if transaction_type else ''} transactions found for user <@{user_id}>.")
+        return [
+            {
+                **trans,
+                'time': datetime.fromisoformat(trans['timestamp'].replace('Z', '+00:00')),
+                'round': f"R{trans['round']:02}" if 'round' in trans else self.get_round(trans['timestamp'])
+            }
+            for trans in user_transactions
+        ]
+
+    def load_archived_user_transactions(self, event: str, user_id: int, transaction_type: str = None):
+        """Collect a user's trades from a closed event's archive without loading the whole event."""
+        with TradeArchive(archive_path(event)) as archive:
+            return [
+                {
+                    'transaction_id': trade.transaction_id,
+                    'buyer_id': trade.buyer_id,
+                    'seller_id': trade.seller_id,
+                    'amount': trade.price,
+                    'time': trade.timestamp,
+                    'round': f"R{trade.round:02}" if trade.round else "After R17"
+                }
+                for trade in archive.for_user(user_id)
+                if not transaction_type
+                or (transaction_type.lower() == 'buy' and trade.buyer_id == user_id)
+                or (transaction_type.lower() == 'sell' and trade.seller_id == user_id)
+            ]
+
+    @commands.hybrid_command(name="events")
+    async def events(self, ctx: commands.Context):
+        """
+        List archived events that can be searched with !transactionlog.
+        Usage: !events
+        """
+        events = list_events()
+        if not events:
+            await ctx.send("No events have been archived yet.")
             return
 
-        # Create the message
-        messages = []
-        current_message = f"Transaction log for <@{user_id}>"
-        current_message += f" ({transaction_type.upper()})" if transaction_type else ""
-        current_message += ":\n\n"
-
-        # Sort transactions by timestamp
-        user_transactions.sort(key=lambda x: x['timestamp'])
-
-        current_round = None
-        for trans in user_transactions:
-            timestamp = datetime.fromisoformat(trans['timestamp'].replace('Z', '+00:00'))
-            formatted_time = timestamp.strftime("%Y-%m-%d %H:%M:%S")
-
-            # Check if we need to add a new round header
-            trans_round = self.get_round(trans['timestamp'])
-            if trans_round != current_round:
-                round_header = f"**{trans_round}**\n"
-                if len(current_message + round_header) > 2000:
+        current_message = "# Archived events\n"
+        for info in events:
+            trades = f"{info.trades} transactions" if info.sealed else "still being archived"
+            line = f"- `{info.name}`: {trades} ({info.size / 1024:.1f} KiB)\n"
+            if len(current_message + line) > 2000:
+                await ctx.send(current_message)
+                current_message = ""
+            current_message += line
+        await ctx.send(current_message)
+
+    @commands.hybrid_command(name="transactionlog")
+    @app_commands.describe(
+        user="Player to look up",
+        transaction_type="Only show buys or sells",
+        event="Archived event to search instead of the current one"
+    )
+    async def transaction_log(self, ctx: commands.Context, user: discord.User,
+                              transaction_type: Optional[Literal["buy", "sell"]] = None, event: str = None):
+        """
+        Get transaction log for a specific user.
+        Usage: !transactionlog <user> [buy|sell] [event]
+        """
+        await ctx.defer()
+        async with self.bot.work_gate.slot(REPORT_PRIORITY):
+            user_id = user.id
+            if event:
+                try:
+                    user_transactions = self.load_archived_user_transactions(event, user_id, transaction_type)
+                except (ValueError, FileNotFoundError):
+                    await ctx.send(f"No archive found for event `{event}`.")
+                    return
+            else:
+                transactions = self.load_transactions()
+                if not transactions:
+                    await ctx.send("No transactions found.")
+                    return
+                user_transactions = self.load_user_transactions(transactions, user_id, transaction_type)
+
+            if not user_transactions:
+                await ctx.send(f"No {'buy' if transaction_type else ''} transactions found for user <@{user_id}>.")
+                return
+
+            # Create the message
+            messages = []
+            current_message = f"Transaction log for <@{user_id}>"
+            current_message += f" ({transaction_type.upper()})" if transaction_type else ""
+            current_message += ":\n\n"
+
+            # Sort transactions by timestamp
+            user_transactions.sort(key=lambda x: x['time'])
+
+            current_round = None
+            for trans in user_transactions:
+                formatted_time = trans['time'].strftime("%Y-%m-%d %H:%M:%S")
+
+                # Check if we need to add a new round header
+                trans_round = trans['round']
+                if trans_round != current_round:
+                    round_header = f"**{trans_round}**\n"
+                    if len(current_message + round_header) > 2000:
+                        messages.append(current_message)
+                        current_message = round_header
+                    else:
+                        current_message += round_header
+                    current_round = trans_round
+
+                transaction_line = (
+                    f"Transaction #{trans['transaction_id']:02} - {formatted_time}\n"
+                    f"Amount: ${trans['amount']}\n"
+                    f"{'Bought from' if trans['buyer_id'] == user_id else 'Sold to'} "
+                    f"<@{trans['seller_id'] if trans['buyer_id'] == user_id else trans['buyer_id']}>\n\n"
+                )
+
+                # Check if adding this line would exceed Discord's character limit
+                if len(current_message + transaction_line) > 2000:
                     messages.append(current_message)
-                    current_message = round_header
+                    current_message = transaction_line
                 else:
-                    current_message += round_header
-                current_round = trans_round
-
-            transaction_line = (
-                f"Transaction #{trans['transaction_id']:02} - {formatted_time}\n"
-                f"Amount: ${trans['amount']}\n"
-                f"{'Bought from' if trans['buyer_id'] == user_id else 'Sold to'} "
-                f"<@{trans['seller_id'] if trans['buyer_id'] == user_id else trans['buyer_id']}>\n\n"
-            )
-
-            # Check if adding this line would exceed Discord's character limit
-            if len(current_message + transaction_line) > 2000:
-                messages.append(current_message)
-                current_message = transaction_line
-            else:
-                current_message += transaction_line
+                    current_message += transaction_line
 
-        if current_message:
-            messages.append(current_message)
+            if current_message:
+                messages.append(current_message)
 
-        # Send all messages
-        for message in messages:
-            await ctx.send(message)
+            # Send all messages
+            for message in messages:
+                await ctx.send(message)
 
 
 async def setup(bot: commands.Bot) -> None:
@@ -1,8 +1,18 @@
-from typing import Dict
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, List, Optional
 
+import discord
+from discord import app_commands
 from discord.ext import commands
 
-from utils.config_utils import load_config, save_config
+from cogs.evaluatepenalties import ROUND_ENDS, load_transactions
+from utils.archive_utils import archive_path, event_dir, seal_event, unsealed_events, write_archive
+from utils.config_utils import invalidate_config_cache, load_config, save_config
+
+logger = logging.getLogger(__name__)
 
 class HorseAdmin(commands.Cog):
     """
@@ -21,171 +31,454 @@ class HorseAdmin(commands.Cog):
         """
         self.bot = bot
 
-    @commands.command(name="sethorsechannel")
+    @staticmethod
+    def resolve_channels(ctx: commands.Context, targets: Optional[str], config: Dict) -> List[discord.abc.GuildChannel]:
+        """
+        Turn a list of channel and category mentions or IDs into text channels.
+
+        Categories expand to their text channels and `all` to every horse channel in the server.
+        Without targets, the current channel is used.
+
+        Args:
+            ctx (commands.Context): The command context
+            targets (Optional[str]): Space-separated channel mentions, IDs or `all`
+            config (Dict): The loaded configuration
+
+        Returns:
+            List[discord.abc.GuildChannel]: The channels, without duplicates, in the order given
+        """
+        if not targets:
+            return [ctx.channel]
+
+        channels = {}
+        for token in targets.split():
+            if token.lower() == "all":
+                for cid in config.get("horsechannels", {}):
+                    channel = ctx.guild.get_channel(int(cid))
+                    if channel is not None:
+                        channels[channel.id] = channel
+                continue
+
+            match = re.fullmatch(r"<#(\d+)>|(\d+)", token)
+            channel = ctx.guild.get_channel(int(match.group(1) or match.group(2))) if match else None
+            if channel is None:
+                raise commands.BadArgument(f"`{token}` is not a channel or category in this server")
+            if isinstance(channel, discord.CategoryChannel):
+                for text_channel in channel.text_channels:
+                    channels[text_channel.id] = text_channel
+            else:
+                channels[channel.id] = channel
+        return list(channels.values())
+
+    def apply_config(self, config: Dict) -> None:
+        """
+        Write the configuration in one atomic update and notify the Trading cog once.
+        """
+        save_config(config)
+        trading_cog = self.bot.get_cog('Trading')
+        if trading_cog:
+            trading_cog.reload_config()
+
+    @staticmethod
+    def _channel_list(channels: List[discord.abc.GuildChannel]) -> str:
+        return ", ".join(channel.mention for channel in channels)
+
+    @commands.hybrid_command(name="sethorsechannel")
     @commands.has_permissions(manage_channels=True)
-    async def sethorsechannel(self, ctx: commands.Context) -> None:
+    @app_commands.default_permissions(manage_channels=True)
+    @app_commands.describe(targets="Channels or categories to set up, separated by spaces. Defaults to this channel.")
+    async def sethorsechannel(self, ctx: commands.Context, *, targets: str = None) -> None:
+        """
+        Configure channels for horse trading.
+
+        Args:
+            ctx (commands.Context): The command context
+            targets (str): Channel or category mentions or IDs. Defaults to the current channel.
+        """
         try:
             config = load_config()
+            channels = self.resolve_channels(ctx, targets, config)
             if "horsechannels" not in config:
                 config["horsechannels"] = {}
-            config["horsechannels"][ctx.channel.id] = ctx.channel.name
+            for channel in channels:
+                config["horsechannels"][str(channel.id)] = channel.name
+            self.apply_config(config)
+
+            if targets:
+                await ctx.send(f"✅ {len(channels)} channel(s) are now configured for horse trading: "
+                               f"{self._channel_list(channels)}")
+            else:
+                await ctx.send(f"✅ This channel is now configured for horse trading.")
+        except Exception as e:
+            await ctx.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
+
+    async def set_closed(self, ctx: commands.Context, targets: Optional[str], closed: bool) -> None:
+        """
+        Open or close horse channels with a single config write.
+
+        Args:
+            ctx (commands.Context): The command context
+            targets (Optional[str]): Channel or category mentions, IDs or `all`
+            closed (bool): Whether to close the channels
+        """
+        config = load_config()
+        config["horsechannels"] = config.get("horsechannels", {})
+        channels = self.resolve_channels(ctx, targets, config)
+        closed_channels = set(config.get("closed_channels", []))
+
+        horse_channels = [channel for channel in channels if str(channel.id) in config["horsechannels"]]
+        if closed:
+            changed = [channel for channel in horse_channels if channel.id not in closed_channels]
+            closed_channels.update(channel.id for channel in changed)
+        else:
+            changed = [channel for channel in horse_channels if channel.id in closed_channels]
+            closed_channels.difference_update(channel.id for channel in changed)
+
+        if changed:
+            # Sorted so the file only changes when the set does
+            config["closed_channels"] = sorted(closed_channels)
+            self.apply_config(config)
+
+        if not targets:
+            # Single-channel form keeps the original replies
+            if not horse_channels:
+                await ctx.send("This channel is not set up for horse trading. Use `!sethorsechannel` first.",
+                               ephemeral=True)
+            elif changed:
+                await ctx.send("🚫 Trading in this channel is now closed." if closed
+                               else "✅ Channel is now open for horse trading.")
+            elif closed:
+                await ctx.send("Channel is already closed.", ephemeral=True)
+            else:
+                await ctx.send("Channel is not closed. Did you set it as horsechannel with `!sethorsechannel`?",
+                               ephemeral=True)
+        else:
+            summary = (f"{'🚫 Closed' if closed else '✅ Opened'} {len(changed)} channel(s)"
+                       + (f": {self._channel_list(changed)}" if changed else "."))
+            skipped = len(channels) - len(horse_channels)
+            if skipped:
+                summary += f"\n-# Skipped {skipped} channel(s) not set up for horse trading."
+            await ctx.send(summary)
+
+    @commands.hybrid_command(name="close")
+    @commands.has_permissions(manage_channels=True)
+    @app_commands.default_permissions(manage_channels=True)
+    @app_commands.describe(targets="Channels, categories or `all`, separated by spaces. Defaults to this channel.")
+    async def closehorse(self, ctx: commands.Context, *, targets: str = None) -> None:
+        """
+        Close horse channels for trading.
+
+        Args:
+            ctx (commands.Context): The command context
+            targets (str): Channel or category mentions, IDs or `all`. Defaults to the current channel.
+        """
+        try:
+            await self.set_closed(ctx, targets, closed=True)
+        except Exception as e:
+            await ctx.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
+
+    @commands.hybrid_command(name="open")
+    @commands.has_permissions(manage_channels=True)
+    @app_commands.default_permissions(manage_channels=True)
+    @app_commands.describe(targets="Channels, categories or `all`, separated by spaces. Defaults to this channel.")
+    async def openhorse(self, ctx: commands.Context, *, targets: str = None) -> None:
+        """
+        Open horse channels for trading.
+
+        Args:
+            ctx (commands.Context): The command context
+            targets (str): Channel or category mentions, IDs or `all`. Defaults to the current channel.
+        """
+        try:
+            await self.set_closed(ctx, targets, closed=False)
+        except Exception as e:
+            await ctx.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
+
+    @commands.hybrid_command(name="setlogchannel")
+    @commands.has_permissions(manage_channels=True)
+    @app_commands.default_permissions(manage_channels=True)
+    async def setlogchannel(self, ctx: commands.Context) -> None:
+        """
+        Set the current channel as the central transaction log.
+
+        Args:
+            ctx (commands.Context): The command context
+        """
+        try:
+            config = load_config()
+            # Store the channel ID as an integer to maintain consistency
+            config["log_channel"] = ctx.channel.id
             save_config(config)
-            
-            # Reload configuration in Trading cog
+
+            # Reload configuration in Trading cog to ensure it's updated
             trading_cog = self.bot.get_cog('Trading')
             if trading_cog:
                 trading_cog.reload_config()
-            
-            await ctx.send(f"✅ This channel is now configured for horse trading.")
+
+            await ctx.send("✅ This channel is now set as the log channel.")
         except Exception as e:
             await ctx.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
 
-    @commands.command(name="close")
+    @commands.hybrid_command(name="reloadconfig")
     @commands.has_permissions(manage_channels=True)
-    async def closehorse(self, ctx: commands.Context) -> None:
+    @app_commands.default_permissions(manage_channels=True)
+    async def reloadconfig(self, ctx: commands.Context) -> None:
         """
-        Close the current channel for horse trading.
-        
+        Re-read config.json from disk after it was edited by hand.
+
         Args:
             ctx (commands.Context): The command context
         """
         try:
-            config = load_config()
-            config["closed_channels"] = config.get("closed_channels", [])
-            config["horsechannels"] = config.get("horsechannels", {})
-            cid = ctx.channel.id
-            if str(cid) not in config["horsechannels"]:
-                await ctx.send("This channel is not set up for horse trading. Use `!sethorsechannel` first.",
-                               ephemeral=True)
-                return
+            invalidate_config_cache()
 
-            if cid not in config["closed_channels"]:
-                config["closed_channels"].append(cid)
-                save_config(config)
-                await ctx.send("🚫 Trading in this channel is now closed.")
-            else:
-                await ctx.send("Channel is already closed.", ephemeral=True)
-
-            # Reload configuration in Trading cog
             trading_cog = self.bot.get_cog('Trading')
             if trading_cog:
                 trading_cog.reload_config()
+
+            await ctx.send("✅ Configuration reloaded from disk.")
         except Exception as e:
             await ctx.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
 
-    @commands.command(name="open")
+    @commands.hybrid_command(name="offerttl")
     @commands.has_permissions(manage_channels=True)
-    async def openhorse(self, ctx: commands.Context) -> None:
+    @app_commands.default_permissions(manage_channels=True)
+    async def offerttl(self, ctx: commands.Context, seconds: int) -> None:
         """
-        Open the current channel for horse trading.
+        Set how long offers in the current channel stay open. Use 0 to keep them open indefinitely.
 
         Args:
             ctx (commands.Context): The command context
+            seconds (int): Offer lifetime in seconds
         """
         try:
             config = load_config()
-            config["closed_channels"] = config.get("closed_channels", [])
-            config["horsechannels"] = config.get("horsechannels", {})
-            cid = ctx.channel.id
-            if str(cid) not in config["horsechannels"]:
-                await ctx.send("This channel is not set up for horse trading. Use `!sethorsechannel` first.",
-                               ephemeral=True)
-                return
-
-            if cid in config["closed_channels"]:
-                config["closed_channels"].remove(cid)  # Changed this line
-                save_config(config)
-                await ctx.send("✅ Channel is now open for horse trading.")
+            config["offer_ttls"] = config.get("offer_ttls", {})
+            if seconds > 0:
+                config["offer_ttls"][str(ctx.channel.id)] = seconds
             else:
-                await ctx.send("Channel is not closed. Did you set it as horsechannel with `!sethorsechannel`?", ephemeral=True)
+                config["offer_ttls"].pop(str(ctx.channel.id), None)
+            save_config(config)
 
-            # Reload configuration in Trading cog
             trading_cog = self.bot.get_cog('Trading')
             if trading_cog:
                 trading_cog.reload_config()
+
+            if seconds > 0:
+                await ctx.send(f"⌛ New offers in this channel now expire after {seconds} seconds.")
+            else:
+                await ctx.send("✅ Offers in this channel no longer expire.")
         except Exception as e:
             await ctx.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
 
-    @commands.command(name="setlogchannel")
+    @commands.hybrid_command(name="roundexpiry")
     @commands.has_permissions(manage_channels=True)
-    async def setlogchannel(self, ctx: commands.Context) -> None:
+    @app_commands.default_permissions(manage_channels=True)
+    async def roundexpiry(self, ctx: commands.Context, enabled: bool) -> None:
         """
-        Set the current channel as the central transaction log.
+        Choose whether all open offers expire when a round is closed with !endround.
 
         Args:
             ctx (commands.Context): The command context
+            enabled (bool): Whether offers expire at round close
         """
         try:
             config = load_config()
-            # Store the channel ID as an integer to maintain consistency
-            config["log_channel"] = ctx.channel.id
+            config["expire_at_round_close"] = enabled
             save_config(config)
 
-            # Reload configuration in Trading cog to ensure it's updated
             trading_cog = self.bot.get_cog('Trading')
             if trading_cog:
                 trading_cog.reload_config()
 
-            await ctx.send("✅ This channel is now set as the log channel.")
+            await ctx.send(f"✅ Offers will {'now' if enabled else 'no longer'} expire at the end of each round.")
         except Exception as e:
             await ctx.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
 
-    @commands.command(name="reset")
+    @commands.hybrid_command(name="auctionmode")
     @commands.has_permissions(manage_channels=True)
-    async def reset(self, ctx: commands.Context) -> None:
+    @app_commands.default_permissions(manage_channels=True)
+    async def auctionmode(self, ctx: commands.Context, enabled: bool) -> None:
         """
-        Reset all configuration and transaction data to empty state.
-        Requires administrator permissions.
+        Choose whether orders in the current channel are matched continuously or collected for an auction
+        that clears at a single price when the round is closed with !endround.
 
         Args:
             ctx (commands.Context): The command context
+            enabled (bool): Whether the channel trades by auction
         """
         try:
-            # Reset config.json to empty object
-            with open('data/config.json', 'w') as config_file:
-                config_file.write('{}')
+            config = load_config()
+            cid = str(ctx.channel.id)
+            if cid not in config.get("horsechannels", {}):
+                await ctx.send("This channel is not set up for horse trading. Use `!sethorsechannel` first.",
+                               ephemeral=True)
+                return
 
-            # Reset transactions.json to empty array
-            with open('data/transactions.json', 'w') as transactions_file:
-                transactions_file.write('[]')
+            auction_channels = set(config.get("auction_channels", []))
+            if enabled:
+                auction_channels.add(cid)
+            else:
+                auction_channels.discard(cid)
+            config["auction_channels"] = sorted(auction_channels)
+            save_config(config)
 
-            # Reload configuration in Trading cog
             trading_cog = self.bot.get_cog('Trading')
             if trading_cog:
                 trading_cog.reload_config()
 
-            await ctx.send("✅ Successfully reset all data files.")
+            if enabled:
+                await ctx.send("🔔 Orders in this channel are now collected and cleared in one auction at the end of each round.")
+            else:
+                await ctx.send("✅ Orders in this channel are now matched as soon as they are posted.")
         except Exception as e:
             await ctx.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
 
+    @commands.hybrid_command(name="endround")
+    @commands.has_permissions(manage_channels=True)
+    @app_commands.default_permissions(manage_channels=True)
+    async def endround(self, ctx: commands.Context) -> None:
+        """
+        Close the current round: clear auction channels, reset accept limits and expire open offers if enabled.
+
+        Args:
+            ctx (commands.Context): The command context
+        """
+        try:
+            trading_cog = self.bot.get_cog('Trading')
+            if not trading_cog:
+                await ctx.send("Trading is not available right now.", ephemeral=True)
+                return
 
-    @commands.command(name="softreset")
+            new_round = trading_cog.close_round()
+            await ctx.send(f"🏁 Round closed. Round {new_round} has started.")
+        except Exception as e:
+            await ctx.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
+
+    @commands.hybrid_command(name="archive")
     @commands.has_permissions(manage_channels=True)
-    async def softreset(self, ctx: commands.Context) -> None:
+    @app_commands.default_permissions(manage_channels=True)
+    async def archive(self, ctx: commands.Context, event: str) -> None:
         """
-        Perform a soft reset that clears transactions and removes closed channels,
-        while preserving other configuration data.
+        Write the current transactions to a compact, read-only archive for the given event name.
 
         Args:
             ctx (commands.Context): The command context
+            event (str): Name to store the archive under
         """
         try:
-            # Reset transactions.json to empty array
-            with open('data/transactions.json', 'w') as transactions_file:
-                transactions_file.write('[]')
+            path = archive_path(event)
+            if path.exists():
+                await ctx.send(f"An archive for `{event}` already exists.", ephemeral=True)
+                return
+
+            count = write_archive(path, load_transactions(), ROUND_ENDS.values())
+            await ctx.send(f"✅ Archived {count} transactions as `{event}`.")
+        except Exception as e:
+            await ctx.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
+
+    async def cog_load(self) -> None:
+        # Finish sealing events whose rollover was interrupted by a restart
+        for event in unsealed_events():
+            asyncio.create_task(self._seal(event))
+
+    async def _seal(self, event: str) -> int:
+        """
+        Build an event's archive off the event loop.
+        """
+        count = await asyncio.to_thread(seal_event, event, ROUND_ENDS.values())
+        logger.info("Sealed event %s with %d transactions", event, count, extra={"event": event, "trades": count})
+        return count
+
+    async def start_new_event(self, ctx: commands.Context, event: str, config_updates: Optional[Dict]) -> bool:
+        """
+        Seal the current event under the given name and open a fresh live store.
+
+        Args:
+            ctx (commands.Context): The command context
+            event (str): Name to archive the current event under
+            config_updates (Dict): Settings to change for the new event, or None to start from an empty config
+
+        Returns:
+            bool: Whether the rollover happened
+        """
+        trading_cog = self.bot.get_cog('Trading')
+        if not trading_cog:
+            await ctx.send("Trading is not available right now.", ephemeral=True)
+            return False
 
-            # Load and modify config to remove closed channels
+        folder = event_dir(event)
+        if folder.exists() or archive_path(event).exists():
+            await ctx.send(f"An archive for `{event}` already exists.", ephemeral=True)
+            return False
+
+        # Only renames happen before the new event is open; the archive is built afterwards
+        trading_cog.roll_over(folder)
+        if config_updates is None:
+            save_config({})
+        else:
             config = load_config()
-            config["closed_channels"] = []  # Reset closed channels list
-            config["trade_counter"] = 0  # Reset trade counter
+            config.update(config_updates)
             save_config(config)
+        trading_cog.reload_config()
+        await ctx.send(f"🗃️ Event `{event}` is closed and a new one has started. Archiving it in the background…")
 
-            # Reload configuration in Trading cog
-            trading_cog = self.bot.get_cog('Trading')
-            if trading_cog:
-                trading_cog.reload_config()
+        count = await self._seal(event)
+        await ctx.send(f"✅ Archived {count} transactions as `{event}`.")
+        return True
+
+    @commands.hybrid_command(name="newevent")
+    @commands.has_permissions(manage_channels=True)
+    @app_commands.default_permissions(manage_channels=True)
+    async def newevent(self, ctx: commands.Context, event: str) -> None:
+        """
+        Archive the current event under a name and start a new one with the same channels.
+        Closed channels and the trade counter are reset.
+
+        Args:
+            ctx (commands.Context): The command context
+            event (str): Name to archive the current event under
+        """
+        try:
+            await self.start_new_event(ctx, event, {"closed_channels": [], "trade_counter": 0})
+        except Exception as e:
+            await ctx.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
+
+    @commands.hybrid_command(name="reset")
+    @commands.has_permissions(manage_channels=True)
+    @app_commands.default_permissions(manage_channels=True)
+    async def reset(self, ctx: commands.Context) -> None:
+        """
+        Reset all configuration and transaction data to empty state.
+        The previous data is archived as a `reset-<time>` event first.
+        Requires administrator permissions.
+
+        Args:
+            ctx (commands.Context): The command context
+        """
+        try:
+            if await self.start_new_event(ctx, f"reset-{time.strftime('%Y%m%d-%H%M%S')}", None):
+                await ctx.send("✅ Successfully reset all data files.")
+        except Exception as e:
+            await ctx.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
 
-            await ctx.send("✅ Successfully reset transactions and cleared closed channels.")
+
+    @commands.hybrid_command(name="softreset")
+    @commands.has_permissions(manage_channels=True)
+    @app_commands.default_permissions(manage_channels=True)
+    async def softreset(self, ctx: commands.Context) -> None:
+        """
+        Perform a soft reset that clears transactions and removes closed channels,
+        while preserving other configuration data.
+        The previous data is archived as a `softreset-<time>` event first.
+
+        Args:
+            ctx (commands.Context): The command context
+        """
+        try:
+            if await self.start_new_event(ctx, f"softreset-{time.strftime('%Y%m%d-%H%M%S')}",
+                                          {"closed_channels": [], "trade_counter": 0}):
+                await ctx.send("✅ Successfully reset transactions and cleared closed channels.")
         except Exception as e:
             await ctx.send(f"❌ An error occurred: {str(e)}", ephemeral=True)
 
@@ -1,13 +1,48 @@
-import re, json, os
-from typing import Optional, Tuple
+import asyncio
+import logging
+import os
+import re
+import shutil
+import time
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import Optional, Tuple, Dict, Any, List
 
 import discord
-from discord.ext import commands
-from utils.config_utils import load_config, save_config
+from discord.ext import commands, tasks
+from utils.admission_utils import AdmissionController, ShedTracker, TRADE_PRIORITY
+from utils.auction_utils import allocate, clearing_price
+from utils.codec_utils import DecodeError, OfferRecord, TradeRecord, dumps, loads
+from utils.config_utils import load_config, DATA_DIR, CONFIG_FILE, TRANSACTIONS_FILE
+from utils.effects_utils import SideEffectRunner
 from utils.emoji_utils import EmojiManager
+from utils.journal_utils import Journal
+from utils.snapshot_utils import save_snapshot, load_snapshot, remove_snapshot
+from utils.timer_utils import TimerWheel
+from utils.timing_utils import PhaseTimer
 from utils.trading_utils import TradingManager, Offer
 
-OFFERS_FILE = "data/offers.json"
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = DATA_DIR / "state.snapshot"
+JOURNAL_FILE = DATA_DIR / "journal.log"
+SNAPSHOT_INTERVAL = 50  # Trades between automatic snapshots
+# Discord side effects of a trade, run in this order once its intent is durable
+TRADE_EFFECTS = ("reactions", "reply", "log")
+# Admission limits for trade messages: tokens per second and burst size
+USER_RATE, USER_BURST = 0.5, 4
+CHANNEL_RATE, CHANNEL_BURST = 5.0, 20
+MAX_QUEUED_MESSAGES = 50  # Shed new messages while this many are waiting for a slot
+SHED_NOTICE_DELAY = 5.0  # Seconds of shed messages collected into one notice
+# Offer expiry: timer wheel resolution and size, and how expired offers are re-reacted
+EXPIRY_TICK = 1.0
+EXPIRY_WHEEL_SLOTS = 512
+EXPIRY_REACTION_BATCH = 5
+EXPIRY_REACTION_DELAY = 1.0
+EXPIRED_EMOJI = "⌛"
+RECENT_TRADES = 200  # Trades kept in memory for the HTTP API
+MAX_QUANTITY = 20  # Most units a single order may ask for
 
 class Trading(commands.Cog):
     def __init__(self, bot: commands.Bot):
@@ -16,40 +51,566 @@ class Trading(commands.Cog):
         self.emoji_manager = EmojiManager()
         self.offers = {}  # channel_id: list of offers
         self.transaction_data = {}
+        self.journal = Journal(JOURNAL_FILE)
+        self.trades_since_snapshot = 0
+        # Trades whose intent is journaled but that are not fully settled yet, by batch id
+        self.unsettled_batches: Dict[int, List[TradeRecord]] = {}
+        # Batches not yet written to the transaction file
+        self.uncommitted: set = set()
+        # Side effects of each batch that have not completed yet
+        self.pending_effects: Dict[int, set] = {}
+        self.effect_runner = SideEffectRunner(
+            self.record_effect_done, give_up_on=(discord.NotFound, discord.Forbidden)
+        )
+        self.effects_resumed = False
+        self.admission = AdmissionController(USER_RATE, USER_BURST, CHANNEL_RATE, CHANNEL_BURST)
+        self.shed_tracker = ShedTracker()
+        # channel_id: monotonic time the "not a horse channel" warning was last sent there
+        self.unconfigured_warned: Dict[int, float] = {}
+        self.offer_wheel = TimerWheel(EXPIRY_TICK, EXPIRY_WHEEL_SLOTS, time.time())
+        self.recent_trades = deque(maxlen=RECENT_TRADES)
+        self.config_version = 0
 
         # Load configuration
         config = load_config()
         self.finished_horses = set(config.get("closed_channels", []))
+        # Only a floor for data from before the journal; the journal and transaction file know the real last id
         self.transaction_counter = config.get("trade_counter", 0)
         self.logchannel = config.get("log_channel")
         self.horse_channels = config.get("horsechannels", {})
-        self.closed_channels = config.get("closed_channels", {})
+        self.closed_channels = self.finished_horses
+        self.offer_ttls = config.get("offer_ttls", {})
+        self.expire_at_round_close = config.get("expire_at_round_close", False)
+        self.auction_channels = set(config.get("auction_channels", []))
+
+        # Rebuild balances, rankings and order books from the last snapshot
+        self.restore_state()
+
+    async def cog_load(self) -> None:
+        self.expire_offers_loop.start()
+
+    async def cog_unload(self) -> None:
+        self.expire_offers_loop.cancel()
+        self.effect_runner.cancel_all()
+        self.save_state()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Finish announcing trades that were interrupted by a restart
+        if self.effects_resumed:
+            return
+        self.effects_resumed = True
+        for batch_id in list(self.pending_effects):
+            self.schedule_effects(batch_id)
+
+    def restore_state(self) -> None:
+        """Restore state from the snapshot, then replay the journal written after it."""
+        timer = self.bot.startup_timer
+        offset = 0
+        # Trades already in the transaction file, whose ledger effect must not be applied twice
+        committed = set()
+        with timer.phase("snapshot load"):
+            snapshot = load_snapshot(SNAPSHOT_FILE)
+
+        if snapshot is not None and snapshot["journal_offset"] <= self.journal.size():
+            with timer.phase("snapshot restore"):
+                self._restore_snapshot(snapshot)
+                offset = snapshot["journal_offset"]
+        else:
+            # The transaction file holds every committed trade, including those from before the journal
+            # existed; the journal then adds the order books, rounds and trades that were never committed
+            with timer.phase("transaction file replay"):
+                committed = self.replay_transactions()
+            if self.journal.size() == 0:
+                self.save_state()
+                return
+
+        aborted = {}
+        with timer.phase("journal replay"):
+            for record, _ in self.journal.read_from(offset):
+                if record["op"] == "abort":
+                    # Rolled back by an earlier recovery already
+                    aborted.pop(record["transaction_id"], None)
+                elif not self.apply_journal_record(record, committed):
+                    aborted[record["transaction_id"]] = record
+
+        with timer.phase("trade recovery"):
+            # Roll back trades whose resting offer was already gone
+            for transaction_id, record in aborted.items():
+                self.journal.append({"op": "abort", "channel_id": record["channel_id"],
+                                     "transaction_id": transaction_id})
+            # Redo trades that were applied but never reached the transaction file
+            recommitted = bool(self.uncommitted)
+            for batch_id in sorted(self.uncommitted):
+                self.commit_batch(batch_id)
+            # Snapshot past the recovery so the next start does not repeat it
+            if aborted or recommitted:
+                self.save_state()
+
+    def _restore_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        """Load a snapshot into memory, upgrading ones written by older versions."""
+        self.trading_manager.load_state(snapshot["trading"])
+        for channel_id, offers in snapshot["offers"].items():
+            for message_id, user_id, offer_type, price, *quantity in offers:
+                # Version 1 offers have no quantity and are always a single unit
+                self._add_offer(channel_id, self._restore_offer(
+                    channel_id, message_id, user_id, offer_type, price, quantity[0] if quantity else 1
+                ))
+        self.transaction_counter = max(self.transaction_counter, snapshot["transaction_counter"])
+        if "unsettled_batches" in snapshot:
+            self.unsettled_batches = snapshot["unsettled_batches"]
+        else:
+            # Version 1 tracked each trade on its own, i.e. as a batch of one keyed by its id
+            self.unsettled_batches = {
+                transaction_id: [record] for transaction_id, record in snapshot.get("unsettled_trades", {}).items()
+            }
+        self.uncommitted = snapshot.get("uncommitted", set())
+        self.pending_effects = snapshot.get("pending_effects", {})
+        self.recent_trades.extend(snapshot.get("recent_trades", []))
+
+    def save_state(self) -> None:
+        """Write a snapshot covering everything in the journal so far."""
+        offers = {
+            channel_id: [
+                (offer.message.id, offer.user_id, offer.offer_type, offer.price, offer.quantity)
+                for offer in channel_offers if offer.active
+            ]
+            for channel_id, channel_offers in self.offers.items()
+        }
+        save_snapshot(SNAPSHOT_FILE, {
+            "journal_offset": self.journal.size(),
+            "transaction_counter": self.transaction_counter,
+            "trading": self.trading_manager.get_state(),
+            "offers": offers,
+            "unsettled_batches": self.unsettled_batches,
+            "uncommitted": self.uncommitted,
+            "pending_effects": self.pending_effects,
+            "recent_trades": list(self.recent_trades)
+        })
+        self.trades_since_snapshot = 0
+
+    def reset_state(self) -> None:
+        """Drop the ledger, order books, journal and snapshot."""
+        self.trading_manager = TradingManager()
+        self.offers = {}
+        self.offer_wheel = TimerWheel(EXPIRY_TICK, EXPIRY_WHEEL_SLOTS, time.time())
+        self.recent_trades.clear()
+        self.effect_runner.cancel_all()
+        self.unsettled_batches = {}
+        self.uncommitted = set()
+        self.pending_effects = {}
+        self.journal.truncate()
+        remove_snapshot(SNAPSHOT_FILE)
+        self.trades_since_snapshot = 0
+        self.transaction_counter = 0
+
+    def roll_over(self, folder: Path) -> None:
+        """
+        Move the live store into an event folder and start an empty one.
+        Files are renamed, not copied, so this takes the same time however much was traded.
+        """
+        # Make the transaction file complete before it leaves; announcements still pending are dropped
+        for batch_id in sorted(self.uncommitted):
+            self.commit_batch(batch_id)
+
+        folder.mkdir(parents=True)
+        for path in (TRANSACTIONS_FILE, JOURNAL_FILE, SNAPSHOT_FILE):
+            if path.exists():
+                os.replace(path, folder / path.name)
+        # The live config carries on into the next event, so keep a copy of it as it was
+        if CONFIG_FILE.exists():
+            shutil.copyfile(CONFIG_FILE, folder / CONFIG_FILE.name)
+
+        self.reset_state()
+        self.save_transactions({"transactions": []})
+        logger.info("Rolled the live store over into %s", folder, extra={"event_dir": str(folder)})
+
+    def _restore_offer(self, channel_id: int, message_id: int, user_id: int, offer_type: str, price: int,
+                       quantity: int = 1) -> Offer:
+        """Recreate an offer without fetching its message from Discord."""
+        message = self.bot.get_partial_messageable(channel_id).get_partial_message(message_id)
+        return Offer(message, user_id, offer_type, price, quantity=quantity)
+
+    def _partial_message(self, channel_id: int, message_id: int) -> discord.PartialMessage:
+        return self.bot.get_partial_messageable(channel_id).get_partial_message(message_id)
+
+    def _add_offer(self, channel_id: int, offer: Offer) -> None:
+        """Put an offer on the book and arm its expiry if the channel has an offer TTL."""
+        self.offers.setdefault(channel_id, []).append(offer)
+        ttl = self.offer_ttls.get(str(channel_id))
+        if ttl:
+            now = time.time()
+            age = now - offer.message.created_at.timestamp()
+            self.offer_wheel.schedule((channel_id, offer.message.id), ttl - age, now)
+
+    def _deactivate_offer(self, channel_id: int, message_id: int) -> bool:
+        """Mark an offer inactive, returning False if it was not active."""
+        for offer in self.offers.get(channel_id, []):
+            if offer.message.id == message_id and offer.active:
+                offer.active = False
+                self.offer_wheel.cancel((channel_id, message_id))
+                return True
+        return False
+
+    def _active_offer(self, channel_id: int, message_id: int) -> Optional[Offer]:
+        for offer in self.offers.get(channel_id, []):
+            if offer.message.id == message_id and offer.active:
+                return offer
+        return None
+
+    def _fill_offer(self, channel_id: int, message_id: int) -> bool:
+        """Take one unit from an offer, returning False if it was not active."""
+        offer = self._active_offer(channel_id, message_id)
+        if offer is None:
+            return False
+        offer.quantity -= 1
+        if offer.quantity <= 0:
+            offer.active = False
+            self.offer_wheel.cancel((channel_id, message_id))
+        return True
+
+    def expire_offers(self, channel_id: int, message_ids) -> list:
+        """Remove a batch of offers from a channel's book and return the ones that were still active."""
+        message_ids = set(message_ids)
+        expired = [offer for offer in self.offers.get(channel_id, [])
+                   if offer.message.id in message_ids and offer.active]
+        if not expired:
+            return []
+        self.journal.append({"op": "expire", "channel_id": channel_id,
+                             "message_ids": [offer.message.id for offer in expired]})
+        self._remove_offers(channel_id, [offer.message.id for offer in expired])
+        return expired
+
+    def _remove_offers(self, channel_id: int, message_ids) -> None:
+        """Deactivate offers and compact the channel's book in one pass."""
+        message_ids = set(message_ids)
+        kept = []
+        for offer in self.offers.get(channel_id, []):
+            if offer.message.id in message_ids:
+                offer.active = False
+                self.offer_wheel.cancel((channel_id, offer.message.id))
+            elif offer.active:
+                kept.append(offer)
+        self.offers[channel_id] = kept
+
+    def close_round(self) -> int:
+        """Run the auctions, then advance to the next round, expiring every resting offer if that mode is on."""
+        for channel_id in list(self.offers):
+            if str(channel_id) in self.auction_channels and channel_id not in self.finished_horses:
+                self.run_auction(channel_id)
+
+        new_round = self.trading_manager.current_round + 1
+        self.journal.append({"op": "round", "channel_id": None, "round": new_round})
+        self.trading_manager.current_round = new_round
+
+        if self.expire_at_round_close:
+            expired = []
+            for channel_id, offers in list(self.offers.items()):
+                expired.extend(self.expire_offers(channel_id, [offer.message.id for offer in offers if offer.active]))
+            if expired:
+                asyncio.create_task(self.mark_expired(expired))
+        return new_round
+
+    @tasks.loop(seconds=EXPIRY_TICK)
+    async def expire_offers_loop(self):
+        expired_by_channel = {}
+        for channel_id, message_id in self.offer_wheel.advance(time.time()):
+            expired_by_channel.setdefault(channel_id, []).append(message_id)
+
+        expired = []
+        for channel_id, message_ids in expired_by_channel.items():
+            expired.extend(self.expire_offers(channel_id, message_ids))
+        if expired:
+            asyncio.create_task(self.mark_expired(expired))
+
+    @expire_offers_loop.before_loop
+    async def before_expire_offers_loop(self):
+        await self.bot.wait_until_ready()
+
+    async def mark_expired(self, offers) -> None:
+        """Swap the 🆗 reaction of expired offers for ⌛, a small batch at a time to stay under rate limits."""
+        for start in range(0, len(offers), EXPIRY_REACTION_BATCH):
+            batch = offers[start:start + EXPIRY_REACTION_BATCH]
+            results = await asyncio.gather(
+                *(self._mark_offer_expired(offer) for offer in batch), return_exceptions=True
+            )
+            for offer, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.warning("Failed to mark offer as expired: %s", result,
+                                   extra={"channel_id": offer.message.channel.id, "message_id": offer.message.id})
+            if start + EXPIRY_REACTION_BATCH < len(offers):
+                await asyncio.sleep(EXPIRY_REACTION_DELAY)
+
+    async def _mark_offer_expired(self, offer: Offer) -> None:
+        await offer.message.remove_reaction("🆗", self.bot.user)
+        await offer.message.add_reaction(EXPIRED_EMOJI)
+
+    def apply_journal_record(self, record: Dict[str, Any], committed: set = frozenset()) -> bool:
+        """
+        Apply one journal record to the in-memory state, returning False for a trade that must be rolled back.
+        Trades whose ids are in committed are already in the ledger, so only their other effects are applied.
+        """
+        op = record["op"]
+        channel_id = record["channel_id"]
+        if op == "offer":
+            self._add_offer(channel_id, self._restore_offer(
+                channel_id, record["message_id"], record["user_id"], record["offer_type"], record["price"],
+                record.get("quantity", 1)
+            ))
+        elif op == "cancel":
+            self._deactivate_offer(channel_id, record["message_id"])
+        elif op == "trade":
+            return self.apply_trade(record, ledger=record["transaction_id"] not in committed)
+        elif op == "expire":
+            self._remove_offers(channel_id, record["message_ids"])
+        elif op == "round":
+            self.trading_manager.current_round = record["round"]
+        elif op == "commit":
+            batch_id = self._batch_of(record)
+            self.uncommitted.discard(batch_id)
+            self._settle_if_done(batch_id)
+        elif op == "effect":
+            batch_id = self._batch_of(record)
+            self.pending_effects.get(batch_id, set()).discard(record["effect"])
+            self._settle_if_done(batch_id)
+        return True
+
+    def apply_trade(self, record: TradeRecord, ledger: bool = True) -> bool:
+        """
+        Apply a one-unit trade intent to the order book and ledger, returning False if its offer is gone.
+        With ledger=False the balances are left alone because they were rebuilt from the transaction file.
+        """
+        # Never hand out an id that is already in the journal, even for a rolled back trade
+        self.transaction_counter = max(self.transaction_counter, record["transaction_id"])
+        # Auction trades rest on both sides, continuous trades only on the offer side
+        filled = [record["offer_message_id"]]
+        if record.get("auction"):
+            filled.append(record["message_id"])
+        if not all(self._active_offer(record["channel_id"], message_id) for message_id in filled):
+            return False
+        for message_id in filled:
+            self._fill_offer(record["channel_id"], message_id)
+
+        acceptor_id = record.get("acceptor_id")
+        if acceptor_id is not None:
+            accepts = self.trading_manager.record_accept(acceptor_id)
+            if accepts > self.trading_manager.ACCEPT_LIMIT:
+                self.trading_manager.charge_accept_penalty(acceptor_id)
+
+        if ledger:
+            self.trading_manager.apply_transaction(
+                record["buyer_id"], record["seller_id"], record["amount"], record["channel_id"]
+            )
+
+        self.recent_trades.append(record)
+
+        batch_id = self._batch_of(record)
+        self.unsettled_batches.setdefault(batch_id, []).append(record)
+        self.uncommitted.add(batch_id)
+        self.pending_effects.setdefault(batch_id, set(TRADE_EFFECTS))
+        return True
+
+    @staticmethod
+    def _batch_of(record: Dict[str, Any]) -> int:
+        # Records journaled before multi-unit orders belong to a batch of one
+        return record.get("batch_id", record.get("transaction_id"))
+
+    def _settle_if_done(self, batch_id: int) -> None:
+        if batch_id not in self.uncommitted and not self.pending_effects.get(batch_id):
+            self.pending_effects.pop(batch_id, None)
+            self.unsettled_batches.pop(batch_id, None)
+
+    def commit_batch(self, batch_id: int) -> bool:
+        """Write a batch of trades to the transaction file in one go and journal the commit. Safe to repeat."""
+        records = self.unsettled_batches[batch_id]
+        try:
+            transaction_data = self.read_transactions()
+        except DecodeError:
+            # Never overwrite committed history we cannot read; the batch stays uncommitted in the journal
+            logger.error("Transaction file is unreadable, not committing batch %s", batch_id)
+            return False
+        recorded = {t["transaction_id"] for t in transaction_data["transactions"]}
+        new_transactions = [
+            {
+                "transaction_id": record["transaction_id"],
+                "buyer_id": record["buyer_id"],
+                "seller_id": record["seller_id"],
+                "channel_id": record["channel_id"],
+                "amount": record["amount"],
+                "timestamp": record["timestamp"],
+                # Trades journaled before rounds were recorded fall back to their timestamp when archived
+                **({"round": record["round"]} if "round" in record else {})
+            }
+            for record in records if record["transaction_id"] not in recorded
+        ]
+        if new_transactions:
+            transaction_data["transactions"].extend(new_transactions)
+            if not self.save_transactions(transaction_data):
+                return False
+
+        self.journal.append({"op": "commit", "channel_id": records[0]["channel_id"], "batch_id": batch_id})
+        self.uncommitted.discard(batch_id)
+        self._settle_if_done(batch_id)
+        return True
+
+    def record_effect_done(self, batch_id: int, effect: str) -> None:
+        self.journal.append({"op": "effect", "channel_id": self.unsettled_batches[batch_id][0]["channel_id"],
+                             "batch_id": batch_id, "effect": effect})
+        self.pending_effects.get(batch_id, set()).discard(effect)
+        self._settle_if_done(batch_id)
+
+    def schedule_effects(self, batch_id: int) -> None:
+        """Run the remaining Discord side effects of a batch in the background."""
+        records = self.unsettled_batches[batch_id]
+        remaining = self.pending_effects.get(batch_id, set())
+        effects = {
+            "reactions": lambda: self._announce_reactions(records),
+            "reply": lambda: self._announce_reply(records),
+            "log": lambda: self._announce_log(records)
+        }
+        self.effect_runner.submit(
+            batch_id,
+            [(name, effects[name]) for name in TRADE_EFFECTS if name in remaining]
+        )
 
+    @classmethod
+    def _effect_nonce(cls, records: List[TradeRecord], effect: str) -> str:
+        """
+        Nonce for a message posted by an effect. It is the same on every retry, so Discord drops a repeat
+        of a message it already accepted (e.g. when the request timed out after it went through).
+        """
+        record = records[0]
+        # Batch ids restart with each event, so the timestamp tells apart batches that share one
+        return f"{effect}-{cls._batch_of(record)}-{zlib.crc32(record['timestamp'].encode()):08x}"
+
+    @staticmethod
+    def _id_range(first: TradeRecord, last: TradeRecord) -> str:
+        if first["transaction_id"] == last["transaction_id"]:
+            return f"#{first['transaction_id']:02}"
+        return f"#{first['transaction_id']:02}–#{last['transaction_id']:02}"
+
+    @staticmethod
+    def _fill_lines(records: List[TradeRecord]) -> List[str]:
+        """Describe a batch with one line per pair of orders that traded."""
+        lines = []
+        start = 0
+        for end in range(1, len(records) + 1):
+            if (end == len(records) or
+                    records[end]["offer_message_id"] != records[start]["offer_message_id"] or
+                    records[end]["message_id"] != records[start]["message_id"]):
+                first, last = records[start], records[end - 1]
+                units = end - start
+                lines.append(
+                    f"{Trading._id_range(first, last)}: <@{first['buyer_id']}> buys {units} from <@{first['seller_id']}> "
+                    f"for ${first['amount']}{' each' if units > 1 else ''}"
+                )
+                start = end
+        return lines
+
+    async def _announce_reactions(self, records: List[TradeRecord]) -> None:
+        # Final state of every message in the batch: ✅ once nothing is left, 🆗 while it still rests
+        left = {}
+        for record in records:
+            left[record["offer_message_id"]] = record["resting_left"]
+            left[record["message_id"]] = record["incoming_left"]
+        flag = records[0]["flag"]
+        messages = [(self._partial_message(records[0]["channel_id"], message_id), units)
+                    for message_id, units in left.items()]
+        for message, _ in messages:
+            await message.clear_reactions()
+        for message, units in messages:
+            await message.add_reaction('✅' if units == 0 else '🆗')
+        for message, _ in messages:
+            await message.add_reaction(flag)
+
+    async def _announce_reply(self, records: List[TradeRecord]) -> None:
+        record = records[0]
+        if record.get("auction"):
+            # Auction fills have no incoming message, so post one summary to the channel
+            await self.bot.get_partial_messageable(record["channel_id"]).send(
+                f"🔔 Auction cleared at ${record['amount']}: {len(records)} traded {record['flag']}\n"
+                + "\n".join(f"- {line}" for line in self._fill_lines(records)),
+                nonce=self._effect_nonce(records, "reply")
+            )
+            return
+        message = self._partial_message(record["channel_id"], record["message_id"])
+        if len(records) == 1:
+            await message.reply(
+                f"✅ Transaction #{record['transaction_id']:02} {record['flag']}: "
+                f"<@{record['buyer_id']}> buys from <@{record['seller_id']}> for ${record['amount']}",
+                nonce=self._effect_nonce(records, "reply")
+            )
+            return
+        await message.reply(
+            f"✅ Transactions #{record['transaction_id']:02}–#{records[-1]['transaction_id']:02} {record['flag']}:\n"
+            + "\n".join(f"- {line}" for line in self._fill_lines(records)),
+            nonce=self._effect_nonce(records, "reply")
+        )
+
+    async def _announce_log(self, records: List[TradeRecord]) -> None:
+        if not self.logchannel:
+            return
+        record = records[0]
+        logchannel = self.bot.get_partial_messageable(int(self.logchannel))
+        link_base = f"https://discord.com/channels/{record['guild_id']}/{record['channel_id']}"
+        if record.get("auction"):
+            await logchannel.send(
+                f"## {record['channel_name']} Auction at ${record['amount']}, "
+                f"{self._id_range(record, records[-1])} {record['flag']}\n"
+                + "\n".join(self._fill_lines(records)),
+                nonce=self._effect_nonce(records, "log")
+            )
+            return
+        if len(records) == 1:
+            first_msg_link = f"{link_base}/{record['offer_message_id']}"
+            second_msg_link = f"{link_base}/{record['message_id']}"
+            await logchannel.send(
+                f"## {record['channel_name']} Transaction #{record['transaction_id']:02} {record['flag']}\n "
+                f"<@{record['buyer_id']}> buys from <@{record['seller_id']}> for ${record['amount']}\n"
+                f"-# [Jump to first message]({first_msg_link}) | [Jump to second message]({second_msg_link})",
+                nonce=self._effect_nonce(records, "log")
+            )
+            return
+        await logchannel.send(
+            f"## {record['channel_name']} Transactions #{record['transaction_id']:02}–"
+            f"#{records[-1]['transaction_id']:02} {record['flag']}\n"
+            + "\n".join(self._fill_lines(records))
+            + f"\n-# [Jump to order]({link_base}/{record['message_id']})",
+            nonce=self._effect_nonce(records, "log")
+        )
+
+    def replay_transactions(self) -> set:
+        """Apply every recorded transaction to the in-memory ledger, returning their ids."""
+        replayed = set()
+        for transaction in self.load_transactions()["transactions"]:
+            self.trading_manager.apply_transaction(
+                transaction["buyer_id"],
+                transaction["seller_id"],
+                transaction["amount"],
+                transaction["channel_id"]
+            )
+            self.transaction_counter = max(self.transaction_counter, transaction["transaction_id"])
+            replayed.add(transaction["transaction_id"])
+        return replayed
 
     def reload_config(self):
         config = load_config()
         self.finished_horses = set(config.get("closed_channels", []))
-        self.transaction_counter = config.get("trade_counter", 0)
+        # The config can lag behind the journal (e.g. after a failed commit), so never move the counter back;
+        # only reset_state starts it over
+        self.transaction_counter = max(self.transaction_counter, config.get("trade_counter", 0))
         self.logchannel = config.get("log_channel")
         self.horse_channels = config.get("horsechannels", {})
-        self.closed_channels = config.get("closed_channels", {})
-
-    def load_offers(self) -> None:
-        """Load offers from the JSON file."""
-        if os.path.exists(OFFERS_FILE):
-            try:
-                with open(OFFERS_FILE, 'r') as f:
-                    saved_offers = json.load(f)
-
-                # Convert saved data back to Offer objects
-                for channel_id, offers in saved_offers.items():
-                    self.offers[int(channel_id)] = [
-                        Offer(None, offer['user_id'], offer['offer_type'], offer['price'])
-                        for offer in offers
-                        if offer['active']  # Only load active offers
-                    ]
-            except (json.JSONDecodeError, FileNotFoundError):
-                self.offers = {}
+        self.closed_channels = self.finished_horses
+        self.offer_ttls = config.get("offer_ttls", {})
+        self.expire_at_round_close = config.get("expire_at_round_close", False)
+        self.auction_channels = set(config.get("auction_channels", []))
+        self.config_version += 1
+
+    @property
+    def state_version(self) -> str:
+        """Changes whenever the books, ledger or configuration change."""
+        return f"{self.journal.appended}.{self.config_version}"
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -60,53 +621,122 @@ class Trading(commands.Cog):
 
         # Check if the channel is a horse channel
         if str(message.channel.id) not in self.horse_channels:
+            # Drop ordinary chatter before running the offer parser
+            if not message.content.lstrip().lower().startswith(("buy", "sell")):
+                return
+            # Rate limit these like trades so a flood of offers cannot turn into a flood of replies
+            if not self.admit(message):
+                self.shed(message)
+                return
             # Check if the message looks like a trading command
-            offer_type, price = self.parse_offer(message.content)
-            if offer_type is not None:
+            offer_type, _, _ = self.parse_offer(message.content)
+            if offer_type is not None and self.should_warn_unconfigured(message.channel.id):
                 await message.reply("⚠️ This channel is not set up for horse trading. An admin needs to use `!sethorsechannel` to enable trading here.")
             return
 
         if message.content.startswith("!"):
             return
 
+        # Admission control before any parsing, reactions or matching
+        if not self.admit(message):
+            self.shed(message)
+            return
+
+        async with self.bot.work_gate.slot(TRADE_PRIORITY):
+            await self.handle_trade_message(message)
+
+    def admit(self, message: discord.Message) -> bool:
+        """Check rate limits and overall load for an incoming trade message."""
+        if self.bot.work_gate.waiting >= MAX_QUEUED_MESSAGES:
+            return False
+        return self.admission.admit(message.author.id, message.channel.id)
+
+    def should_warn_unconfigured(self, channel_id: int) -> bool:
+        """Allow one "not a horse channel" warning per channel every SHED_NOTICE_DELAY seconds."""
+        now = time.monotonic()
+        if now - self.unconfigured_warned.get(channel_id, -SHED_NOTICE_DELAY) < SHED_NOTICE_DELAY:
+            return False
+        self.unconfigured_warned[channel_id] = now
+        return True
+
+    def shed(self, message: discord.Message) -> None:
+        """Drop a message, scheduling one notice per channel instead of reacting to each."""
+        logger.debug("Shed trade message", extra={"channel_id": message.channel.id, "user_id": message.author.id})
+        if self.shed_tracker.add(message.channel.id, message.author.id):
+            asyncio.get_running_loop().call_later(
+                SHED_NOTICE_DELAY, lambda: asyncio.create_task(self.send_shed_notice(message.channel))
+            )
+
+    async def send_shed_notice(self, channel: discord.abc.Messageable) -> None:
+        counts = self.shed_tracker.pop(channel.id)
+        if not counts:
+            return
+        summary = ", ".join(f"{count} from <@{user_id}>" for user_id, count in counts.items())
+        try:
+            await channel.send(
+                f"⚠️ The market is busy, so these messages were ignored: {summary}. "
+                f"Please wait a moment and post again.",
+                allowed_mentions=discord.AllowedMentions.none()
+            )
+        except discord.HTTPException as e:
+            logger.warning("Failed to send shed notice: %s", e, extra={"channel_id": channel.id})
+
+    async def handle_trade_message(self, message: discord.Message) -> None:
         # Handle cancellation
         if await self.handle_cancellation(message):
             return
 
         # Parse offer
-        offer_type, price = self.parse_offer(message.content)
+        offer_type, price, quantity = self.parse_offer(message.content)
         if offer_type is None:
             return await message.add_reaction("❌")
 
         await message.add_reaction("🆗")
 
-        # Create new offer
-        new_offer = Offer(message, message.author.id, offer_type, price)
-
         # Initialize channel offers if needed
         if message.channel.id not in self.offers:
             self.offers[message.channel.id] = []
 
-        # Try to find matching offer
-        match_offer = self.find_matching_offer(message.channel.id, offer_type, price)
-
-        if match_offer:
-            await self.process_transaction(message, match_offer, offer_type, price)
-        else:
-            self.offers[message.channel.id].append(new_offer)
+        # Fill as many units as possible against resting offers, unless orders wait for the round's auction
+        fills = []
+        if str(message.channel.id) not in self.auction_channels:
+            fills = self.plan_fills(message.channel.id, offer_type, price, quantity)
+        filled = sum(units for _, units in fills)
+        if fills:
+            await self.process_transaction(message, fills, offer_type, quantity)
+
+        # Whatever is left rests on the book
+        if filled < quantity:
+            logger.debug("Offer resting", extra={"channel_id": message.channel.id, "user_id": message.author.id,
+                                                 "message_id": message.id, "quantity": quantity - filled})
+            record: OfferRecord = {
+                "op": "offer",
+                "channel_id": message.channel.id,
+                "message_id": message.id,
+                "user_id": message.author.id,
+                "offer_type": offer_type,
+                "price": price,
+                "quantity": quantity - filled
+            }
+            self.journal.append(record)
+            self._add_offer(message.channel.id, Offer(
+                message, message.author.id, offer_type, price, quantity=quantity - filled
+            ))
 
     @staticmethod
-    def parse_offer(content: str) -> Tuple[Optional[str], Optional[int]]:
-        match = re.match(r"^(buy|sell)\s+(\d{1,2})$", content.strip().lower())
+    def parse_offer(content: str) -> Tuple[Optional[str], Optional[int], Optional[int]]:
+        """Parse `buy 20` or `buy 3 @ 20` into (offer type, price, quantity)."""
+        match = re.match(r"^(buy|sell)\s+(?:(\d{1,2})\s*@\s*)?(\d{1,2})$", content.strip().lower())
         if not match:
-            return None, None
+            return None, None, None
 
-        offer_type, price = match.groups()
+        offer_type, quantity, price = match.groups()
         price = int(price)
+        quantity = int(quantity) if quantity else 1
 
-        if 5 <= price <= 99:
-            return offer_type, price
-        return None, None
+        if 5 <= price <= 99 and 1 <= quantity <= MAX_QUANTITY:
+            return offer_type, price, quantity
+        return None, None, None
 
     async def handle_cancellation(self, message: discord.Message) -> bool:
         if not message.reference or message.content.lower().strip() != "cancel":
@@ -119,7 +749,8 @@ class Trading(commands.Cog):
             if (offer.message.id == ref_msg_id and
                     offer.user_id == message.author.id and
                     offer.active):
-                offer.active = False
+                self._deactivate_offer(message.channel.id, offer.message.id)
+                self.journal.append({"op": "cancel", "channel_id": message.channel.id, "message_id": offer.message.id})
                 await offer.message.clear_reactions()
                 await offer.message.add_reaction("🚫")
                 await message.add_reaction("✅")
@@ -128,7 +759,8 @@ class Trading(commands.Cog):
         await message.add_reaction("❌")
         return True
 
-    def find_matching_offer(self, channel_id: int, offer_type: str, price: int) -> Optional[Offer]:
+    def find_matching_offers(self, channel_id: int, offer_type: str, price: int) -> List[Offer]:
+        """Return the resting offers an order at this price can trade with, best price and oldest first."""
         channel_offers = self.offers.get(channel_id, [])
         opposite = 'sell' if offer_type == 'buy' else 'buy'
         candidates = [o for o in channel_offers if o.offer_type == opposite and o.active]
@@ -140,81 +772,176 @@ class Trading(commands.Cog):
             matching = [o for o in candidates if o.price >= price]
             matching.sort(key=lambda o: (-o.price, o.message.created_at))
 
-        return matching[0] if matching else None
-
-    async def process_transaction(self, message: discord.Message, match_offer: Offer, offer_type: str, price: int) -> None:
-        match_offer.active = False
-        buyer_id = message.author.id if offer_type == 'buy' else match_offer.user_id
-        seller_id = match_offer.user_id if offer_type == 'buy' else message.author.id
-        final_price = match_offer.price
-
-        if message.author.id != match_offer.user_id:
-            accepts = self.trading_manager.record_accept(message.author.id)
-            if accepts > self.trading_manager.ACCEPT_LIMIT:
-                data = self.trading_manager.get_user_data(message.author.id)
-                if data['garnets'] > 0:
-                    data['garnets'] -= 1
-                else:
-                    data['money'] -= self.trading_manager.FINE_AMOUNT
-
-        self.trading_manager.apply_transaction(buyer_id, seller_id, final_price, message.channel.id)
-        self.transaction_counter += 1
-        await message.clear_reactions()
-        await match_offer.message.clear_reactions()
-        await message.add_reaction('✅')
-        await match_offer.message.add_reaction('✅')
-
-        flag_emoji = self.emoji_manager.get_unique_flag()
-        await message.add_reaction(flag_emoji)
-        await match_offer.message.add_reaction(flag_emoji)
-
-        await message.reply(
-            f"✅ Transaction #{self.transaction_counter:02} {flag_emoji}: "
-            f"<@{buyer_id}> buys from <@{seller_id}> for ${final_price}"
+        return matching
+
+    def plan_fills(self, channel_id: int, offer_type: str, price: int, quantity: int) -> List[Tuple[Offer, int]]:
+        """Walk the book in priority order, taking units until the order is filled or nothing matches."""
+        fills = []
+        remaining = quantity
+        for offer in self.find_matching_offers(channel_id, offer_type, price):
+            if remaining == 0:
+                break
+            units = min(remaining, offer.quantity)
+            fills.append((offer, units))
+            remaining -= units
+        return fills
+
+    async def process_transaction(self, message: discord.Message, fills: List[Tuple[Offer, int]],
+                                  offer_type: str, quantity: int) -> None:
+        """
+        Execute every fill of an incoming order as one batch.
+
+        Each unit is its own transaction so balances, penalties and archives keep
+        counting one share per trade, but the batch is journaled with a single
+        fsync, committed with a single transaction file write and announced once.
+        """
+        batch_id = self.transaction_counter + 1
+        flag = self.emoji_manager.get_unique_flag()
+        acceptor_id = message.author.id
+        incoming_left = quantity
+        trades = []
+        for offer, units in fills:
+            buyer_id = message.author.id if offer_type == 'buy' else offer.user_id
+            seller_id = offer.user_id if offer_type == 'buy' else message.author.id
+            for unit in range(units):
+                incoming_left -= 1
+                trades.append({
+                    "op": "trade",
+                    "transaction_id": batch_id + len(trades),
+                    "batch_id": batch_id,
+                    "buyer_id": buyer_id,
+                    "seller_id": seller_id,
+                    "channel_id": message.channel.id,
+                    "amount": offer.price,
+                    "timestamp": str(message.created_at),
+                    "round": self.trading_manager.current_round,
+                    "offer_message_id": offer.message.id,
+                    "acceptor_id": acceptor_id if acceptor_id != offer.user_id else None,
+                    "message_id": message.id,
+                    "guild_id": message.guild.id,
+                    "channel_name": message.channel.name,
+                    "flag": flag,
+                    "resting_left": offer.quantity - unit - 1,
+                    "incoming_left": incoming_left
+                })
+
+        self.settle_batch(trades)
+
+    def run_auction(self, channel_id: int) -> int:
+        """
+        Clear a channel's call auction at a single price and settle every crossed unit.
+        Returns the number of units traded.
+        """
+        offers = [offer for offer in self.offers.get(channel_id, []) if offer.active]
+        clearing = clearing_price(
+            ((o.price, o.quantity) for o in offers if o.offer_type == 'buy'),
+            ((o.price, o.quantity) for o in offers if o.offer_type == 'sell')
         )
+        if clearing is None:
+            return 0
+
+        # Best price first, then oldest, on each side
+        bids = sorted((o for o in offers if o.offer_type == 'buy' and o.price >= clearing.price),
+                      key=lambda o: (-o.price, o.message.created_at))
+        asks = sorted((o for o in offers if o.offer_type == 'sell' and o.price <= clearing.price),
+                      key=lambda o: (o.price, o.message.created_at))
+        pairs = allocate([(o.price, o.quantity) for o in bids], [(o.price, o.quantity) for o in asks],
+                         clearing.volume)
+
+        batch_id = self.transaction_counter + 1
+        flag = self.emoji_manager.get_unique_flag()
+        timestamp = str(discord.utils.utcnow())
+        channel_name = self.horse_channels.get(str(channel_id), str(channel_id))
+        guild_id = getattr(getattr(self.bot.get_channel(channel_id), "guild", None), "id", None)
+        bid_left = [o.quantity for o in bids]
+        ask_left = [o.quantity for o in asks]
+        trades = []
+        for bid_index, ask_index in pairs:
+            bid, ask = bids[bid_index], asks[ask_index]
+            bid_left[bid_index] -= 1
+            ask_left[ask_index] -= 1
+            trades.append({
+                "op": "trade",
+                "transaction_id": batch_id + len(trades),
+                "batch_id": batch_id,
+                "auction": True,
+                "buyer_id": bid.user_id,
+                "seller_id": ask.user_id,
+                "channel_id": channel_id,
+                "amount": clearing.price,
+                "timestamp": timestamp,
+                "round": self.trading_manager.current_round,
+                "offer_message_id": ask.message.id,
+                "acceptor_id": None,
+                "message_id": bid.message.id,
+                "guild_id": guild_id,
+                "channel_name": channel_name,
+                "flag": flag,
+                "resting_left": ask_left[ask_index],
+                "incoming_left": bid_left[bid_index]
+            })
+
+        self.settle_batch(trades)
+        return len(trades)
+
+    def settle_batch(self, trades: List[TradeRecord]) -> None:
+        """Journal, apply, commit and announce a batch of trades sharing one batch id."""
+        batch_id = trades[0]["batch_id"]
+        timer = PhaseTimer()
+        # The durable intent comes first: from here on a crash is redone at startup
+        with timer.phase("journal"):
+            self.journal.append_many(trades, sync=True)
+        with timer.phase("apply"):
+            for trade in trades:
+                self.apply_trade(trade)
+        with timer.phase("announce"):
+            self.schedule_effects(batch_id)
+            for trade in trades:
+                self.bot.dispatch("horse_trade", trade)
+        with timer.phase("commit"):
+            committed = self.commit_batch(batch_id)
+
+        self.trades_since_snapshot += len(trades)
+        if self.trades_since_snapshot >= SNAPSHOT_INTERVAL:
+            with timer.phase("snapshot"):
+                self.save_state()
+
+        fields = {
+            "batch_id": batch_id,
+            "transaction_ids": [trade["transaction_id"] for trade in trades],
+            "channel_id": trades[0]["channel_id"],
+            "buyer_ids": sorted({trade["buyer_id"] for trade in trades}),
+            "seller_ids": sorted({trade["seller_id"] for trade in trades}),
+            "auction": bool(trades[0].get("auction")),
+            "timings_ms": {name: round(seconds * 1000, 3) for name, seconds in timer.phases.items()}
+        }
+        if committed:
+            logger.info("Settled %d trade(s) in batch #%02d", len(trades), batch_id, extra=fields)
+        else:
+            logger.error("Trade batch #%02d will be committed on restart", batch_id, extra=fields)
 
+    def read_transactions(self):
+        """Load transactions from JSON file, raising DecodeError if it is unreadable."""
         try:
-            logchannel = self.bot.get_channel(int(self.logchannel))
-            first_msg_link = f"https://discord.com/channels/{message.guild.id}/{match_offer.message.channel.id}/{match_offer.message.id}"
-            second_msg_link = f"https://discord.com/channels/{message.guild.id}/{message.channel.id}/{message.id}"
-            await logchannel.send(
-                f"## {message.channel.name} Transaction #{self.transaction_counter:02} {flag_emoji}\n "
-                f"<@{buyer_id}> buys from <@{seller_id}> for ${final_price}\n"
-                f"-# [Jump to first message]({first_msg_link}) | [Jump to second message]({second_msg_link})"
-            )
-        except Exception as e:
-            print(f"Failed to send log message: {e}")
-
-
-        config = load_config()
-        config["trade_counter"] = self.transaction_counter
-        save_config(config)
-        transaction_data = self.load_transactions()
-        new_transaction = {
-            "transaction_id": self.transaction_counter,
-            "buyer_id": buyer_id,
-            "seller_id": seller_id,
-            "channel_id": message.channel.id,
-            "amount": final_price,
-            "timestamp": str(message.created_at)
-        }
-        transaction_data["transactions"].append(new_transaction)
-        self.save_transactions(transaction_data)
+            with open(TRANSACTIONS_FILE, 'rb') as f:
+                # Not validated against a schema: a rejected file would be overwritten with an empty one
+                data = loads(f.read())
+        except FileNotFoundError:
+            return {"transactions": []}
+        # If data is a list, wrap it in a dict
+        if isinstance(data, list):
+            return {"transactions": data}
+        return data
 
     def load_transactions(self):
-        """Load transactions from JSON file."""
+        """Load transactions from JSON file, treating an unreadable one as empty."""
         try:
-            with open("data/transactions.json", 'r') as f:
-                data = json.load(f)
-                # If data is a list, wrap it in a dict
-                if isinstance(data, list):
-                    return {"transactions": data}
-                return data
-        except (json.JSONDecodeError, FileNotFoundError):
+            return self.read_transactions()
+        except DecodeError:
             return {"transactions": []}
 
-    def save_transactions(self, transaction_data):
-        """Save transaction data to JSON file."""
+    def save_transactions(self, transaction_data) -> bool:
+        """Save transaction data to JSON file, returning whether it succeeded."""
         try:
             # If transaction_data is a list, convert it to expected format
             if isinstance(transaction_data, list):
@@ -228,10 +955,17 @@ class Trading(commands.Cog):
             else:
                 data_to_save = {"transactions": []}
 
-            with open("data/transactions.json", 'w') as f:
-                json.dump(data_to_save, f, indent=4)
-        except Exception as e:
-            print(f"Failed to save transaction: {e}")
+            # Replace the file atomically so a crash mid-write never leaves it torn
+            tmp_path = TRANSACTIONS_FILE.with_suffix(TRANSACTIONS_FILE.suffix + ".tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(dumps(data_to_save, pretty=True))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, TRANSACTIONS_FILE)
+            return True
+        except Exception:
+            logger.exception("Failed to save transactions")
+            return False
 
 
 async def setup(bot: commands.Bot) -> None:
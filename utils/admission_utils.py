@@ -0,0 +1,154 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# Work priorities for PriorityGate, lower is served first
+TRADE_PRIORITY = 0
+REPORT_PRIORITY = 1
+
+
+class TokenBucket:
+    """
+    Classic token bucket: refills at rate tokens per second up to capacity
+    """
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class AdmissionController:
+    """
+    Admits a message only if both its author's and its channel's bucket have a token.
+
+    Full buckets are interchangeable with missing ones, so idle buckets are
+    dropped periodically to keep memory bounded by recent activity.
+    """
+
+    def __init__(
+            self,
+            user_rate: float,
+            user_burst: float,
+            channel_rate: float,
+            channel_burst: float,
+            prune_interval: float = 60.0
+    ):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.prune_interval = prune_interval
+        self.user_buckets: Dict[int, TokenBucket] = {}
+        self.channel_buckets: Dict[int, TokenBucket] = {}
+        self._last_prune = time.monotonic()
+
+    def admit(self, user_id: int, channel_id: int, now: Optional[float] = None) -> bool:
+        """
+        Takes a token from both buckets, or from neither if either is empty
+        """
+        now = time.monotonic() if now is None else now
+        if now - self._last_prune >= self.prune_interval:
+            self._prune(now)
+
+        user_bucket = self.user_buckets.get(user_id)
+        if user_bucket is None:
+            user_bucket = self.user_buckets[user_id] = TokenBucket(self.user_rate, self.user_burst, now)
+        channel_bucket = self.channel_buckets.get(channel_id)
+        if channel_bucket is None:
+            channel_bucket = self.channel_buckets[channel_id] = TokenBucket(self.channel_rate, self.channel_burst, now)
+
+        user_bucket.refill(now)
+        channel_bucket.refill(now)
+        if user_bucket.tokens < 1 or channel_bucket.tokens < 1:
+            return False
+        user_bucket.tokens -= 1
+        channel_bucket.tokens -= 1
+        return True
+
+    def _prune(self, now: float) -> None:
+        for buckets in (self.user_buckets, self.channel_buckets):
+            idle = [
+                key for key, bucket in buckets.items()
+                if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.capacity
+            ]
+            for key in idle:
+                del buckets[key]
+        self._last_prune = now
+
+
+class PriorityGate:
+    """
+    Limits how much work runs at once. When the gate is full, waiters are
+    let in by priority and then in arrival order.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, priority: int) -> None:
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # We were handed a slot just as we got cancelled, so pass it on
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
+                return
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class ShedTracker:
+    """
+    Counts shed messages per channel and user so they can be reported in one notice
+    """
+
+    def __init__(self):
+        self.counts: Dict[Hashable, Dict[int, int]] = {}
+
+    def add(self, channel_id: Hashable, user_id: int) -> bool:
+        """
+        Records a shed message, returning True if it is the first since the channel's last notice
+        """
+        channel_counts = self.counts.setdefault(channel_id, {})
+        channel_counts[user_id] = channel_counts.get(user_id, 0) + 1
+        return sum(channel_counts.values()) == 1
+
+    def pop(self, channel_id: Hashable) -> Dict[int, int]:
+        return self.counts.pop(channel_id, {})
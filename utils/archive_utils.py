@@ -0,0 +1,275 @@
+import gzip
+import mmap
+import os
+import shutil
+import stat
+import struct
+from bisect import bisect_left
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from utils.codec_utils import DecodeError, loads
+from utils.config_utils import DATA_DIR
+
+ARCHIVE_DIR = DATA_DIR / "archive"
+ARCHIVE_MAGIC = b"HTAR"
+ARCHIVE_VERSION = 1
+
+# magic, version, record size, record count
+_HEADER = struct.Struct("<4sHHQ")
+# transaction id, buyer id, seller id, channel id, price, epoch-ms timestamp, round, padding
+_RECORD = struct.Struct("<QQQQIqH2x")
+
+
+class ArchivedTrade(NamedTuple):
+    transaction_id: int
+    buyer_id: int
+    seller_id: int
+    channel_id: int
+    price: int
+    timestamp_ms: int
+    round: int
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.timestamp_ms / 1000, tz=timezone.utc)
+
+
+class EventInfo(NamedTuple):
+    name: str
+    trades: Optional[int]
+    size: int
+    sealed: bool
+
+
+def _check_event_name(event_name: str) -> None:
+    if not event_name or not all(c.isalnum() or c in "-_" for c in event_name):
+        raise ValueError("Event names may only contain letters, digits, '-' and '_'")
+
+
+def archive_path(event_name: str) -> Path:
+    """
+    Returns the archive file for an event, rejecting names that are not plain identifiers
+    """
+    _check_event_name(event_name)
+    return ARCHIVE_DIR / f"{event_name}.trades"
+
+
+def event_dir(event_name: str) -> Path:
+    """
+    Returns the directory holding an event's original files once it has been rolled over
+    """
+    _check_event_name(event_name)
+    return ARCHIVE_DIR / event_name
+
+
+def timestamp_to_ms(timestamp: str) -> int:
+    """
+    Converts a stored ISO timestamp to epoch milliseconds, treating naive times as UTC
+    """
+    parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def round_for(timestamp_ms: int, round_ends_ms: List[int]) -> int:
+    """
+    Returns the 1-based round a trade falls in, or 0 if it happened after the last round ended
+    """
+    index = bisect_left(round_ends_ms, timestamp_ms)
+    return index + 1 if index < len(round_ends_ms) else 0
+
+
+def write_archive(path: Path, transactions: Iterable[Dict], round_ends: Iterable[str]) -> int:
+    """
+    Writes transactions to a fixed-width archive file sorted by transaction id.
+    Each trade keeps the round it was recorded in; round_ends only places older trades that have none.
+    Returns the number of records written.
+    """
+    round_ends_ms = sorted(timestamp_to_ms(end) for end in round_ends)
+    records = []
+    for trans in transactions:
+        timestamp_ms = timestamp_to_ms(trans['timestamp'])
+        records.append((
+            trans['transaction_id'],
+            trans['buyer_id'],
+            trans['seller_id'],
+            trans['channel_id'],
+            trans['amount'],
+            timestamp_ms,
+            trans['round'] if 'round' in trans else round_for(timestamp_ms, round_ends_ms)
+        ))
+    records.sort()
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, _RECORD.size, len(records)))
+        buffer = bytearray(_RECORD.size * len(records))
+        for i, record in enumerate(records):
+            _RECORD.pack_into(buffer, i * _RECORD.size, *record)
+        f.write(buffer)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+def _make_read_only(path: Path) -> None:
+    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+
+def seal_event(event_name: str, round_ends: Iterable[str]) -> int:
+    """
+    Turns a rolled-over event directory into its permanent form: writes the indexed
+    trade archive, gzips the original files next to it and makes everything read-only.
+    Safe to run again if it was interrupted. Returns the number of trades archived.
+    """
+    folder = event_dir(event_name)
+    transactions_file = folder / "transactions.json"
+    if transactions_file.exists():
+        try:
+            with open(transactions_file, 'rb') as f:
+                data = loads(f.read())
+        except DecodeError:
+            data = []
+        transactions = data.get("transactions", []) if isinstance(data, dict) else data
+        write_archive(archive_path(event_name), transactions, round_ends)
+
+    for path in list(folder.iterdir()):
+        if path.suffix in (".gz", ".tmp"):
+            continue
+        compressed = path.with_name(path.name + ".gz")
+        tmp_path = compressed.with_name(compressed.name + ".tmp")
+        with open(path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, compressed)
+        os.remove(path)
+        _make_read_only(compressed)
+
+    path = archive_path(event_name)
+    if not path.exists():
+        # An event with no transaction file still gets an (empty) archive
+        write_archive(path, [], round_ends)
+    _make_read_only(path)
+    with TradeArchive(path) as archive:
+        return len(archive)
+
+
+def unsealed_events() -> List[str]:
+    """
+    Returns events that were rolled over but whose sealing never finished
+    """
+    if not ARCHIVE_DIR.exists():
+        return []
+    return sorted(
+        folder.name for folder in ARCHIVE_DIR.iterdir()
+        if folder.is_dir() and any(path.suffix != ".gz" for path in folder.iterdir())
+    )
+
+
+def list_events() -> List[EventInfo]:
+    """
+    Lists archived events, oldest first. Events still being sealed have no trade count yet.
+    """
+    if not ARCHIVE_DIR.exists():
+        return []
+    unsealed = set(unsealed_events())
+    names = {path.stem for path in ARCHIVE_DIR.glob("*.trades")} | unsealed
+    events = []
+    for name in names:
+        path = archive_path(name)
+        folder = event_dir(name)
+        count = None
+        size = 0
+        if name not in unsealed and path.exists():
+            try:
+                with TradeArchive(path) as archive:
+                    count = len(archive)
+            except ValueError:
+                continue
+            size += path.stat().st_size
+        if folder.is_dir():
+            size += sum(f.stat().st_size for f in folder.iterdir())
+        created = (folder if folder.is_dir() else path).stat().st_mtime
+        events.append((created, EventInfo(name, count, size, name not in unsealed)))
+    return [info for _, info in sorted(events)]
+
+
+class TradeArchive:
+    """
+    Read-only, memory-mapped view of a trade archive.
+
+    Records are decoded straight out of the mapping, so scanning an archive
+    only keeps the records a caller chooses to hold on to in memory.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            self._file.close()
+            raise ValueError(f"{self.path} is not a trade archive")
+
+        magic, version, record_size, count = _HEADER.unpack_from(self._mmap)
+        if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION or record_size != _RECORD.size:
+            self.close()
+            raise ValueError(f"{self.path} is not a supported trade archive")
+        self._count = count
+        self._records = memoryview(self._mmap)[_HEADER.size:_HEADER.size + count * _RECORD.size]
+
+    def __enter__(self) -> "TradeArchive":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if getattr(self, "_records", None) is not None:
+            self._records.release()
+            self._records = None
+        self._mmap.close()
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> ArchivedTrade:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return ArchivedTrade(*_RECORD.unpack_from(self._records, index * _RECORD.size))
+
+    def __iter__(self) -> Iterator[ArchivedTrade]:
+        for record in _RECORD.iter_unpack(self._records):
+            yield ArchivedTrade(*record)
+
+    def find(self, transaction_id: int) -> Optional[ArchivedTrade]:
+        """
+        Looks up a trade by id with a binary search over the sorted records
+        """
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if _RECORD.unpack_from(self._records, mid * _RECORD.size)[0] < transaction_id:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self._count:
+            trade = self[low]
+            if trade.transaction_id == transaction_id:
+                return trade
+        return None
+
+    def for_user(self, user_id: int) -> Iterator[ArchivedTrade]:
+        """
+        Yields the trades a user bought or sold in
+        """
+        for record in _RECORD.iter_unpack(self._records):
+            if record[1] == user_id or record[2] == user_id:
+                yield ArchivedTrade(*record)
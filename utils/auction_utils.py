@@ -0,0 +1,67 @@
+from itertools import accumulate
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+MIN_PRICE = 5
+MAX_PRICE = 99
+
+
+class Clearing(NamedTuple):
+    price: int
+    volume: int
+
+
+def clearing_price(bids: Iterable[Tuple[int, int]], asks: Iterable[Tuple[int, int]]) -> Optional[Clearing]:
+    """
+    Finds the single price that crosses the most units between (price, quantity) bids and asks.
+
+    Demand at a price is every unit bid at or above it and supply every unit
+    asked at or below it, both built as running sums over the whole price grid.
+    Ties on volume go to the smallest imbalance, then to the lowest price.
+    Returns None if no bid and ask cross.
+    """
+    size = MAX_PRICE - MIN_PRICE + 1
+    bid_levels = [0] * size
+    ask_levels = [0] * size
+    for price, quantity in bids:
+        bid_levels[price - MIN_PRICE] += quantity
+    for price, quantity in asks:
+        ask_levels[price - MIN_PRICE] += quantity
+
+    supply = list(accumulate(ask_levels))
+    demand = list(accumulate(reversed(bid_levels)))[::-1]
+
+    best = None
+    for index, (units_demanded, units_supplied) in enumerate(zip(demand, supply)):
+        volume = min(units_demanded, units_supplied)
+        if volume == 0:
+            continue
+        key = (-volume, abs(units_demanded - units_supplied))
+        if best is None or key < best[0]:
+            best = (key, index, volume)
+
+    if best is None:
+        return None
+    _, index, volume = best
+    return Clearing(index + MIN_PRICE, volume)
+
+
+def allocate(bids: List[Tuple[int, int]], asks: List[Tuple[int, int]], volume: int) -> List[Tuple[int, int]]:
+    """
+    Pairs units of bids and asks, each already in priority order, until volume units are matched.
+    Returns one (bid index, ask index) pair per unit.
+    """
+    pairs = []
+    bid_index = ask_index = 0
+    bid_left = bids[0][1] if bids else 0
+    ask_left = asks[0][1] if asks else 0
+    while len(pairs) < volume:
+        pairs.append((bid_index, ask_index))
+        bid_left -= 1
+        ask_left -= 1
+        if bid_left == 0 and len(pairs) < volume:
+            bid_index += 1
+            bid_left = bids[bid_index][1]
+        if ask_left == 0 and len(pairs) < volume:
+            ask_index += 1
+            ask_left = asks[ask_index][1]
+    return pairs
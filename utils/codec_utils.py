@@ -0,0 +1,133 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, TypedDict, Union
+
+
+class _TransactionFields(TypedDict):
+    transaction_id: int
+    buyer_id: int
+    seller_id: int
+    channel_id: int
+    amount: int
+    timestamp: str
+
+
+class TransactionRecord(_TransactionFields, total=False):
+    """A committed trade as stored in transactions.json. Older trades have no round."""
+    round: int
+
+
+class TransactionFile(TypedDict):
+    transactions: List[TransactionRecord]
+
+
+class TradeRecord(TypedDict, total=False):
+    """A trade intent as journaled by the Trading cog, one per unit traded"""
+    op: str
+    transaction_id: int
+    batch_id: int
+    auction: bool
+    buyer_id: int
+    seller_id: int
+    channel_id: int
+    amount: int
+    timestamp: str
+    round: int
+    offer_message_id: int
+    acceptor_id: Optional[int]
+    message_id: int
+    guild_id: Optional[int]
+    channel_name: str
+    flag: str
+    resting_left: int
+    incoming_left: int
+
+
+class OfferRecord(TypedDict, total=False):
+    """A resting offer as journaled by the Trading cog"""
+    op: str
+    channel_id: int
+    message_id: int
+    user_id: int
+    offer_type: str
+    price: int
+    quantity: int
+
+
+# Older transaction files are a bare list
+TransactionFileData = Union[TransactionFile, List[TransactionRecord]]
+
+
+def _select_backend(requested: Optional[str]) -> str:
+    for name in ((requested,) if requested else ("orjson", "msgspec")):
+        if name == "json":
+            return "json"
+        try:
+            __import__(name)
+            return name
+        except ImportError:
+            continue
+    return "json"
+
+
+# The fastest installed backend wins: orjson, then msgspec, then the standard library.
+# JSON_CODEC=orjson|msgspec|json picks one explicitly. All of them write the same JSON.
+BACKEND = _select_backend(os.getenv("JSON_CODEC"))
+
+if BACKEND == "orjson":
+    import orjson
+
+    DecodeError = orjson.JSONDecodeError
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any, pretty: bool = False) -> bytes:
+        """
+        Encodes obj as UTF-8 JSON, indented by two spaces when pretty
+        """
+        return orjson.dumps(obj, option=_OPTIONS | orjson.OPT_INDENT_2 if pretty else _OPTIONS)
+
+    def loads(data: Union[bytes, str], type: Any = None) -> Any:
+        """
+        Decodes JSON. Only the msgspec backend validates against type.
+        """
+        return orjson.loads(data)
+
+elif BACKEND == "msgspec":
+    import msgspec
+
+    DecodeError = msgspec.DecodeError
+    _encoder = msgspec.json.Encoder()
+    _decoders: Dict[Any, msgspec.json.Decoder] = {}
+
+    def dumps(obj: Any, pretty: bool = False) -> bytes:
+        """
+        Encodes obj as UTF-8 JSON, indented by two spaces when pretty
+        """
+        data = _encoder.encode(obj)
+        return msgspec.json.format(data, indent=2) if pretty else data
+
+    def loads(data: Union[bytes, str], type: Any = None) -> Any:
+        """
+        Decodes JSON, validating it against type when one is given
+        """
+        decoder = _decoders.get(type)
+        if decoder is None:
+            decoder = _decoders[type] = msgspec.json.Decoder(type) if type is not None else msgspec.json.Decoder()
+        return decoder.decode(data)
+
+else:
+    DecodeError = json.JSONDecodeError
+
+    def dumps(obj: Any, pretty: bool = False) -> bytes:
+        """
+        Encodes obj as UTF-8 JSON, indented by two spaces when pretty
+        """
+        if pretty:
+            return json.dumps(obj, indent=2, ensure_ascii=False).encode()
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+    def loads(data: Union[bytes, str], type: Any = None) -> Any:
+        """
+        Decodes JSON. Only the msgspec backend validates against type.
+        """
+        return json.loads(data)
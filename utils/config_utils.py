@@ -1,27 +1,55 @@
-import json
+import os
 from pathlib import Path
 
-CONFIG_FILE = Path("data/config.json")
+from utils.codec_utils import dumps, loads
+
+DATA_DIR = Path("data")
+CONFIG_FILE = DATA_DIR / "config.json"
+TRANSACTIONS_FILE = DATA_DIR / "transactions.json"
+
+# Raw bytes of the last config read from or written to disk
+_config_cache = None
 
 
 def load_config():
-    """Load configuration from JSON file"""
-    if not CONFIG_FILE.exists():
-        default_config = {
-            "horses": {},
-            "closed_channels": [],
-            "log_channel": None,
-            "trade_counter": 1
-        }
-        save_config(default_config)
-        return default_config
+    """
+    Load configuration from JSON file, reading the disk only once per process.
+    Edits made to the file by hand are picked up after invalidate_config_cache (the !reloadconfig command).
+    """
+    global _config_cache
+    if _config_cache is None:
+        if not CONFIG_FILE.exists():
+            default_config = {
+                "horses": {},
+                "closed_channels": [],
+                "log_channel": None,
+                "trade_counter": 1
+            }
+            save_config(default_config)
+            return default_config
+
+        with open(CONFIG_FILE, 'rb') as f:
+            _config_cache = f.read()
 
-    with open(CONFIG_FILE, 'r') as f:
-        return json.load(f)
+    # Parse a fresh copy so callers can modify it freely
+    return loads(_config_cache)
 
 
 def save_config(config):
-    """Save configuration to JSON file"""
+    """Save configuration to JSON file, replacing it atomically so readers never see a partial write"""
+    global _config_cache
+    data = dumps(config, pretty=True)
     CONFIG_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=2)
+    tmp_path = CONFIG_FILE.with_suffix(CONFIG_FILE.suffix + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, CONFIG_FILE)
+    _config_cache = data
+
+
+def invalidate_config_cache():
+    """Force the next load_config call to read from disk"""
+    global _config_cache
+    _config_cache = None
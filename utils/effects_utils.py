@@ -0,0 +1,77 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Sequence, Tuple, Type
+
+Effect = Tuple[str, Callable[[], Awaitable[None]]]
+
+logger = logging.getLogger(__name__)
+
+
+class SideEffectRunner:
+    """
+    Runs the side effects of a committed change as background tasks.
+
+    Effects are keyed, so submitting the same key twice while it is running
+    does nothing. Each effect is retried with exponential backoff, and
+    on_done is called once it has succeeded so the caller can record it.
+    Delivery is at least once: a failed attempt may still have taken effect
+    (e.g. a request that timed out after Discord accepted it), and a crash
+    after an effect ran but before it was recorded runs it again. Effects
+    must make repeats harmless themselves, such as messages sent with a
+    deterministic nonce, which Discord deduplicates for a few minutes.
+    """
+
+    def __init__(
+            self,
+            on_done: Callable[[Hashable, str], None],
+            attempts: int = 5,
+            base_delay: float = 1.0,
+            give_up_on: Tuple[Type[BaseException], ...] = ()
+    ):
+        self.on_done = on_done
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.give_up_on = give_up_on
+        self.tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def submit(self, key: Hashable, effects: Sequence[Effect]) -> None:
+        """
+        Starts running the given effects in order, unless the key is already running
+        """
+        task = self.tasks.get(key)
+        if task is not None and not task.done():
+            return
+        self.tasks[key] = asyncio.create_task(self._run(key, effects))
+
+    async def _run(self, key: Hashable, effects: Sequence[Effect]) -> None:
+        try:
+            for name, effect in effects:
+                if not await self._attempt(key, name, effect):
+                    # Leave the rest pending so they are retried after a restart
+                    return
+                self.on_done(key, name)
+        finally:
+            self.tasks.pop(key, None)
+
+    async def _attempt(self, key: Hashable, name: str, effect: Callable[[], Awaitable[None]]) -> bool:
+        for attempt in range(self.attempts):
+            try:
+                await effect()
+                return True
+            except self.give_up_on as e:
+                # Retrying cannot help, e.g. the message was deleted
+                logger.warning("Gave up on %s for %s: %s", name, key, e, extra={"effect": name, "key": key})
+                return True
+            except Exception as e:
+                logger.warning("Failed %s for %s (attempt %d/%d): %s", name, key, attempt + 1, self.attempts, e,
+                               extra={"effect": name, "key": key, "attempt": attempt + 1})
+                await asyncio.sleep(self.base_delay * 2 ** attempt)
+        return False
+
+    def cancel_all(self) -> None:
+        """
+        Cancels running effects; they stay pending for the next startup
+        """
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
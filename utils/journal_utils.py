@@ -0,0 +1,82 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from utils.codec_utils import DecodeError, dumps, loads
+
+
+class Journal:
+    """
+    Append-only log of trading events, one JSON record per line.
+
+    Records are addressed by byte offset so a snapshot can remember how far
+    it covers and startup only has to replay the tail written after it.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        # Records appended by this process, usable as a cheap change counter
+        self.appended = 0
+
+    def size(self) -> int:
+        """
+        Returns the current end offset of the journal
+        """
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def append(self, record: Dict[str, Any], sync: bool = False) -> int:
+        """
+        Appends a record and returns the offset just past it.
+        With sync=True the record is flushed to disk before returning.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        line = dumps(record) + b"\n"
+        with open(self.path, 'ab') as f:
+            f.write(line)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+            self.appended += 1
+            return f.tell()
+
+    def append_many(self, records: List[Dict[str, Any]], sync: bool = False) -> int:
+        """
+        Appends several records with a single write (and a single fsync when sync=True)
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lines = b"".join(dumps(record) + b"\n" for record in records)
+        with open(self.path, 'ab') as f:
+            f.write(lines)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+            self.appended += len(records)
+            return f.tell()
+
+    def read_from(self, offset: int = 0) -> Iterator[Tuple[Dict[str, Any], int]]:
+        """
+        Yields (record, end_offset) pairs starting at the given offset.
+        A torn final line from a crash mid-write is ignored.
+        """
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    yield loads(line), offset
+                except DecodeError:
+                    break
+
+    def truncate(self) -> None:
+        """
+        Empties the journal
+        """
+        if self.path.exists():
+            os.remove(self.path)
@@ -0,0 +1,119 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+BUCKET_SIZE = 256  # Keys per bucket before it is split in two
+
+
+class Leaderboard:
+    """
+    Keeps players ranked by net balance and hype.
+
+    Rankings are maintained incrementally, so top-K and rank queries never need to
+    rescan the ledger or the transaction file. Keys live in a list of small sorted
+    buckets rather than one flat list: an update finds its bucket with a binary search
+    over the bucket maxima and only shifts that bucket, which costs O(log n + BUCKET_SIZE)
+    instead of the O(n) memmove of inserting into a single sorted list. A rank query
+    adds up the sizes of the buckets in front, which is O(n / BUCKET_SIZE).
+    """
+
+    def __init__(self):
+        # Each bucket is sorted ascending on (-net, -hype, user_id), i.e. best player first,
+        # and every key in a bucket sorts before every key in the next one
+        self._buckets: List[List[Tuple[int, int, int]]] = []
+        # Last (largest) key of each bucket
+        self._maxes: List[Tuple[int, int, int]] = []
+        self._entries: Dict[int, Tuple[int, int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def _locate(self, key: Tuple[int, int, int]) -> int:
+        """
+        Returns the index of the bucket key belongs in
+        """
+        return min(bisect_left(self._maxes, key), len(self._maxes) - 1)
+
+    def _insert(self, key: Tuple[int, int, int]) -> None:
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            return
+        index = self._locate(key)
+        bucket = self._buckets[index]
+        insort(bucket, key)
+        self._maxes[index] = bucket[-1]
+        if len(bucket) > BUCKET_SIZE:
+            half = len(bucket) // 2
+            self._buckets.insert(index + 1, bucket[half:])
+            del bucket[half:]
+            self._maxes.insert(index, bucket[-1])
+
+    def _delete(self, key: Tuple[int, int, int]) -> None:
+        index = self._locate(key)
+        bucket = self._buckets[index]
+        del bucket[bisect_left(bucket, key)]
+        if bucket:
+            self._maxes[index] = bucket[-1]
+        else:
+            del self._buckets[index]
+            del self._maxes[index]
+
+    def update(self, user_id: int, net: int, hype: int) -> None:
+        """
+        Inserts or moves a player to the position for the given totals
+        """
+        old_key = self._entries.get(user_id)
+        if old_key is not None:
+            self._delete(old_key)
+
+        key = (-net, -hype, user_id)
+        self._insert(key)
+        self._entries[user_id] = key
+
+    def remove(self, user_id: int) -> None:
+        """
+        Drops a player from the rankings
+        """
+        key = self._entries.pop(user_id, None)
+        if key is not None:
+            self._delete(key)
+
+    def clear(self) -> None:
+        self._buckets.clear()
+        self._maxes.clear()
+        self._entries.clear()
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """
+        Returns the 1-based rank of a player, or None if they have not traded
+        """
+        key = self._entries.get(user_id)
+        if key is None:
+            return None
+        index = self._locate(key)
+        ahead = sum(len(bucket) for bucket in self._buckets[:index])
+        return ahead + bisect_left(self._buckets[index], key) + 1
+
+    def entry(self, user_id: int) -> Optional[Tuple[int, int]]:
+        """
+        Returns the (net, hype) totals a player is ranked on
+        """
+        key = self._entries.get(user_id)
+        if key is None:
+            return None
+        return -key[0], -key[1]
+
+    def top(self, k: int) -> List[Tuple[int, int, int]]:
+        """
+        Returns the best k players as (user_id, net, hype) tuples
+        """
+        result = []
+        for bucket in self._buckets:
+            if len(result) >= k:
+                break
+            for neg_net, neg_hype, user_id in bucket[:k - len(result)]:
+                result.append((user_id, -neg_net, -neg_hype))
+        return result
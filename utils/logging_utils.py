@@ -0,0 +1,110 @@
+import copy
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Hashable, Optional, Tuple
+
+from utils.config_utils import DATA_DIR
+
+LOG_DIR = DATA_DIR / "logs"
+LOG_FILE = LOG_DIR / "bot.jsonl"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+DEBUG_SAMPLE_EVERY = 20  # Keep one of every this many records of each debug event
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_traceback_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line, including any `extra` fields
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets every record at INFO and above through, but only one in `every` records of each debug event.
+    Kept records carry a `sampled` field with the rate so counts can be scaled back up.
+    """
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = every
+        self.seen: Dict[Tuple[str, Hashable], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every <= 1:
+            return True
+        # Messages with the same template are the same event
+        key = (record.name, record.msg)
+        count = self.seen.get(key, 0)
+        self.seen[key] = count + 1
+        if count % self.every:
+            return False
+        record.sampled = self.every
+        return True
+
+
+class _StructuredQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message and traceback on the caller's side, where args and the
+        # exception are still live, but leave the formatting to each sink
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level: int = logging.INFO, debug_sample_every: int = DEBUG_SAMPLE_EVERY) -> QueueListener:
+    """
+    Routes all logging through a queue so the event loop never waits on disk or console writes.
+
+    A background thread drains the queue into a rotating JSON-lines file and a plain console stream.
+    Stop the returned listener on shutdown to flush what is still queued.
+    """
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(debug_sample_every))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def parse_level(name: Optional[str], default: int = logging.INFO) -> int:
+    """
+    Returns the logging level for a name like "debug", or default if it is not one
+    """
+    level = logging.getLevelName(name.upper()) if name else default
+    return level if isinstance(level, int) else default
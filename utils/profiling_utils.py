@@ -0,0 +1,45 @@
+import cProfile
+import io
+import pstats
+import tracemalloc
+from typing import List
+
+TRACEMALLOC_FRAMES = 10  # Stack depth recorded per allocation while tracing
+
+
+def profile_summary(profiler: cProfile.Profile, seconds: float, limit: int = 40) -> str:
+    """
+    Summarizes a profile as the top functions by cumulative and by own time
+    """
+    out = io.StringIO()
+    out.write(f"cProfile capture over {seconds:.1f}s\n\n")
+    stats = pstats.Stats(profiler, stream=out).strip_dirs()
+    for sort_key, title in (("cumulative", "By cumulative time"), ("tottime", "By own time")):
+        out.write(f"== {title} ==\n")
+        stats.sort_stats(sort_key).print_stats(limit)
+    return out.getvalue()
+
+
+def allocation_summary(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, seconds: float,
+                       limit: int = 30) -> str:
+    """
+    Summarizes the allocation sites that grew the most during a capture and the largest ones overall
+    """
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>")
+    ]
+    before = before.filter_traces(filters)
+    after = after.filter_traces(filters)
+
+    lines: List[str] = [f"tracemalloc capture over {seconds:.1f}s", "", "== Growth by line =="]
+    lines.extend(str(stat) for stat in after.compare_to(before, "lineno")[:limit])
+    lines.extend(["", "== Largest by line =="])
+    lines.extend(str(stat) for stat in after.statistics("lineno")[:limit])
+
+    top = after.statistics("traceback")
+    if top:
+        lines.extend(["", f"== Traceback of the largest site ({top[0].size / 1024:.1f} KiB) =="])
+        lines.extend(top[0].traceback.format())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,69 @@
+import os
+import pickle
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+SNAPSHOT_MAGIC = b"HTSN"
+SNAPSHOT_VERSION = 2
+# Older versions load_snapshot still accepts; callers upgrade them using the returned "version"
+MIN_SNAPSHOT_VERSION = 1
+
+# magic, version, crc32 of payload, payload length
+_HEADER = struct.Struct("<4sHIQ")
+
+
+def save_snapshot(path: Path, state: Dict[str, Any]) -> None:
+    """
+    Atomically writes a versioned, checksummed binary snapshot of the trading state
+    """
+    path = Path(path)
+    payload = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, zlib.crc32(payload), len(payload))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: Path) -> Optional[Dict[str, Any]]:
+    """
+    Reads a snapshot, returning None if it is missing, from an unsupported version or corrupt.
+    The state's "version" key holds the version it was written with.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+
+    if len(data) < _HEADER.size:
+        return None
+    magic, version, checksum, length = _HEADER.unpack_from(data)
+    payload = data[_HEADER.size:]
+    if (magic != SNAPSHOT_MAGIC or not MIN_SNAPSHOT_VERSION <= version <= SNAPSHOT_VERSION or
+            len(payload) != length or zlib.crc32(payload) != checksum):
+        return None
+
+    try:
+        state = pickle.loads(payload)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    state["version"] = version
+    return state
+
+
+def remove_snapshot(path: Path) -> None:
+    """
+    Deletes a snapshot if one exists
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,60 @@
+from typing import Dict, Hashable, List
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel for many timeouts driven by a single periodic task.
+
+    Each timer lands in the slot for its expiry tick, with a count of full
+    turns still to wait. Scheduling and cancelling are O(1), and each tick
+    only looks at one slot.
+    """
+
+    def __init__(self, tick: float, slots: int, now: float):
+        self.tick = tick
+        self.slots: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self._slot_of: Dict[Hashable, int] = {}
+        self._current_tick = int(now // tick)
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slot_of
+
+    def schedule(self, key: Hashable, delay: float, now: float) -> None:
+        """
+        Arms (or re-arms) a timer for key to fire after delay seconds
+        """
+        self.cancel(key)
+        expiry_tick = max(int((now + max(delay, 0)) // self.tick), self._current_tick + 1)
+        ticks_away = expiry_tick - self._current_tick
+        slot = expiry_tick % len(self.slots)
+        self.slots[slot][key] = (ticks_away - 1) // len(self.slots)
+        self._slot_of[key] = slot
+
+    def cancel(self, key: Hashable) -> None:
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            del self.slots[slot][key]
+
+    def advance(self, now: float) -> List[Hashable]:
+        """
+        Moves the wheel up to now and returns every key that expired on the way
+        """
+        expired = []
+        target_tick = int(now // self.tick)
+        # Visit each slot at most once; later turns are accounted for arithmetically
+        last_tick = min(target_tick, self._current_tick + len(self.slots))
+        for tick in range(self._current_tick + 1, last_tick + 1):
+            slot = self.slots[tick % len(self.slots)]
+            extra_turns = (target_tick - tick) // len(self.slots)
+            for key, rounds in list(slot.items()):
+                if rounds <= extra_turns:
+                    expired.append(key)
+                    del slot[key]
+                    del self._slot_of[key]
+                else:
+                    slot[key] = rounds - 1 - extra_turns
+        self._current_tick = max(self._current_tick, target_tick)
+        return expired
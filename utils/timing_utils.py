@@ -0,0 +1,31 @@
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+
+class PhaseTimer:
+    """
+    Records how long each named startup phase takes
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def elapsed(self) -> float:
+        """
+        Returns seconds since the timer was created
+        """
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        parts = [f"{name} {seconds * 1000:.1f}ms" for name, seconds in self.phases.items()]
+        return ", ".join(parts) if parts else "no phases recorded"
@@ -3,6 +3,8 @@ from typing import Dict, Any
 
 import discord
 
+from utils.leaderboard_utils import Leaderboard
+
 
 @dataclass
 class Offer:
@@ -14,6 +16,7 @@ class Offer:
     offer_type: str
     price: int
     active: bool = True
+    quantity: int = 1
 
 
 class TradingManager:
@@ -27,6 +30,29 @@ class TradingManager:
         self.current_round: int = 1
         self.ACCEPT_LIMIT: int = 2
         self.FINE_AMOUNT: int = 100
+        self.STARTING_MONEY: int = 1000
+        self.leaderboard = Leaderboard()
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Returns the ledger state to be stored in a snapshot
+        """
+        return {
+            'user_balances': self.user_balances,
+            'user_accepts': self.user_accepts,
+            'current_round': self.current_round
+        }
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """
+        Restores the ledger from a snapshot and rebuilds the leaderboard
+        """
+        self.user_balances = state['user_balances']
+        self.user_accepts = state['user_accepts']
+        self.current_round = state['current_round']
+        self.leaderboard.clear()
+        for user_id in self.user_balances:
+            self._update_rank(user_id)
 
     def get_user_data(self, user_id: int) -> Dict[str, Any]:
         """
@@ -34,7 +60,7 @@ class TradingManager:
         """
         if user_id not in self.user_balances:
             self.user_balances[user_id] = {
-                'money': 1000,
+                'money': self.STARTING_MONEY,
                 'hype': {},
                 'garnets': 3
             }
@@ -48,6 +74,26 @@ class TradingManager:
         self.user_accepts[user_id][self.current_round] += 1
         return count + 1
 
+    def charge_accept_penalty(self, user_id: int) -> None:
+        """
+        Takes a garnet from a user who went over the accept limit, or fines them if they have none left
+        """
+        data = self.get_user_data(user_id)
+        if data['garnets'] > 0:
+            data['garnets'] -= 1
+        else:
+            data['money'] -= self.FINE_AMOUNT
+            self._update_rank(user_id)
+
+    def _update_rank(self, user_id: int) -> None:
+        """
+        Moves a user to their new leaderboard position after their balance changed
+        """
+        data = self.get_user_data(user_id)
+        net = data['money'] - self.STARTING_MONEY
+        hype = sum(data['hype'].values())
+        self.leaderboard.update(user_id, net, hype)
+
     def apply_transaction(
             self,
             buyer_id: int,
@@ -66,3 +112,6 @@ class TradingManager:
 
         seller['money'] += price
         seller['hype'][channel_id] = seller['hype'].get(channel_id, 0) - 1
+
+        self._update_rank(buyer_id)
+        self._update_rank(seller_id)